@@ -0,0 +1,311 @@
+import hashlib
+import html
+import io
+import json
+import os
+import shutil
+import sqlite3
+import time
+import zipfile
+from pathlib import Path
+from structure_store import card_sort_key, iter_structure_data
+from card_catalog import CardCatalog, CATALOG_FILE, parse_card_filename
+from card_render import CardRenderer
+import optimize_cards
+
+STORE_FILE = "structure_data.db"
+LEGACY_JSON_FILE = "structure_data.json"
+CARDS_DIR = "final_cards"
+USE_OPTIMIZED_CARDS = True  # 优先使用 optimize_cards 的输出 (比原卡片新时)，减小牌组体积
+BUILD_DIR = "anki_build"
+OUTPUT_APKG = "药理学.apkg"
+DECK_NAME = "药理学"
+
+# 固定 ID：重复构建时笔记、模板和牌组保持不变，重新导入会更新而不是新增
+DECK_ID = 1700000000001
+MODEL_ID = 1700000000002
+NOTE_ID_BASE = 1700000000000000
+CARD_NOTE_ID_OFFSET = 10 ** 13  # 按卡片目录 ID 分配的笔记 ID 从 NOTE_ID_BASE + 该偏移开始，与旧的按 y 坐标分配的 ID 不重叠
+
+MODEL_CSS = """.card { font-family: Arial, sans-serif; font-size: 18px; text-align: left; }
+.name { font-size: 26px; font-weight: bold; text-align: center; }
+.section-title { color: #00acef; font-weight: bold; margin-top: 8px; }
+img { max-width: 100%; }"""
+
+SCHEMA = """
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null, lapses integer not null,
+    left integer not null, odue integer not null, odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (nid INTEGER PRIMARY KEY, fields_hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS card_notes (card_id INTEGER PRIMARY KEY, nid INTEGER NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL);
+"""
+
+
+def collection_json(now):
+    # 旧版 (schema 11) 集合所需的 JSON 配置
+    model = {
+        "id": MODEL_ID, "name": f"{DECK_NAME} 卡片", "type": 0, "mod": now, "usn": -1, "sortf": 0, "did": DECK_ID,
+        "tmpls": [{
+            "name": "Card 1", "ord": 0, "did": None, "bqfmt": "", "bafmt": "", "bfont": "", "bsize": 0,
+            "qfmt": '<div class="name">{{Name}}</div>',
+            "afmt": '{{FrontSide}}<hr id="answer">{{Structure}}<div>{{Image}}</div>',
+        }],
+        "flds": [{"name": n, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+                 for i, n in enumerate(["Name", "Structure", "Image"])],
+        "css": MODEL_CSS, "latexPre": "", "latexPost": "", "latexsvg": False,
+        "req": [[0, "any", [0]]], "tags": [], "vers": [],
+    }
+    deck_base = {"collapsed": False, "browserCollapsed": False, "conf": 1, "desc": "", "dyn": 0, "extendNew": 10,
+                 "extendRev": 50, "lrnToday": [0, 0], "newToday": [0, 0], "revToday": [0, 0],
+                 "timeToday": [0, 0], "mod": now, "usn": -1}
+    decks = {"1": {**deck_base, "id": 1, "name": "Default"},
+             str(DECK_ID): {**deck_base, "id": DECK_ID, "name": DECK_NAME}}
+    dconf = {"1": {
+        "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+        "replayq": True, "dyn": False,
+        "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "separate": True, "order": 1,
+                "perDay": 20, "bury": False},
+        "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+        "rev": {"perDay": 200, "ease4": 1.3, "fuzz": 0.05, "minSpace": 1, "ivlFct": 1, "maxIvl": 36500,
+                "bury": False, "hardFactor": 1.2},
+    }}
+    conf = {"activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0,
+            "estTimes": True, "dueCounts": True, "curModel": str(MODEL_ID), "nextPos": 1,
+            "sortType": "noteFld", "sortBackwards": False, "addToCur": True}
+    return (json.dumps(conf), json.dumps({str(MODEL_ID): model}, ensure_ascii=False),
+            json.dumps(decks, ensure_ascii=False), json.dumps(dconf))
+
+
+def open_collection(path):
+    is_new = not os.path.exists(path)
+    conn = sqlite3.connect(path)
+    if is_new:
+        now = int(time.time())
+        conf, models, decks, dconf = collection_json(now)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+                     (now - now % 86400, now * 1000, now * 1000, conf, models, decks, dconf))
+        conn.commit()
+    return conn
+
+
+def note_id_for(key):
+    # 没有卡片目录时以卡片在长图中的 y 坐标作为 ID；无坐标的键退回到名称哈希
+    suffix = key.rsplit('_', 1)[-1]
+    if '_' in key and suffix.isdigit():
+        return NOTE_ID_BASE + int(suffix)
+    return NOTE_ID_BASE - 1 - int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:12], 16)
+
+
+def card_note_id(state, key, card_id):
+    # 有卡片目录时按卡片 ID 分配，改名和调整边界都不改变笔记 ID (保留复习记录)；
+    # 已按 y 坐标导出过的笔记首次遇到时沿用原 ID
+    if card_id is None: return note_id_for(key)
+    row = state.execute("SELECT nid FROM card_notes WHERE card_id = ?", (card_id,)).fetchone()
+    if row: return row[0]
+    nid = note_id_for(key)
+    legacy = state.execute("SELECT 1 FROM notes WHERE nid = ?", (nid,)).fetchone()
+    if not legacy or state.execute("SELECT 1 FROM card_notes WHERE nid = ?", (nid,)).fetchone():
+        nid = NOTE_ID_BASE + CARD_NOTE_ID_OFFSET + card_id
+    state.execute("INSERT INTO card_notes VALUES (?, ?)", (card_id, nid))
+    return nid
+
+
+def load_card_ids():
+    if not os.path.exists(CATALOG_FILE): return {}
+    catalog = CardCatalog()
+    card_ids = {CardCatalog.key(c): c["id"] for c in catalog.cards()}
+    catalog.close()
+    return card_ids
+
+
+def sections_html(sections):
+    parts = []
+    for section in sections or []:
+        title = section.get('title', '')
+        if title:
+            parts.append(f'<div class="section-title">{html.escape(title)}</div>')
+        items = section.get('items', [])
+        if items:
+            parts.append("<ol>" + "".join(f"<li>{html.escape(i)}</li>" for i in items) + "</ol>")
+    return "".join(parts)
+
+
+class MediaStore:
+    # 媒体按内容 SHA1 去重；源文件的哈希按 (mtime, size) 缓存，未改动的文件不再重复读取
+    def __init__(self, state, media_dir):
+        self.state = state
+        self.media_dir = Path(media_dir)
+        self.media_dir.mkdir(parents=True, exist_ok=True)
+        self.added = 0
+
+    def file_sha1(self, path):
+        st = os.stat(path)
+        row = self.state.execute("SELECT mtime_ns, size, sha1 FROM files WHERE path = ?", (str(path),)).fetchone()
+        if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            return row[2]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.state.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                           (str(path), st.st_mtime_ns, st.st_size, digest))
+        return digest
+
+    def add(self, path):
+        name = f"{self.file_sha1(path)}{Path(path).suffix}"
+        target = self.media_dir / name
+        if not target.exists():
+            # 复制而非硬链接：源文件被原地覆盖时不会污染按哈希命名的媒体
+            shutil.copyfile(path, target)
+            self.added += 1
+        return name
+
+    def add_rendered(self, ref, version, render):
+        # 引用卡片没有源文件：按 (引用, 版本) 缓存哈希，版本不变时不再渲染
+        row = self.state.execute("SELECT mtime_ns, size, sha1 FROM files WHERE path = ?", (ref,)).fetchone()
+        if row and (row[0], row[1]) == version and (self.media_dir / f"{row[2]}.png").exists():
+            return f"{row[2]}.png"
+        buf = io.BytesIO()
+        render().save(buf, format="PNG")
+        digest = hashlib.sha1(buf.getvalue()).hexdigest()
+        target = self.media_dir / f"{digest}.png"
+        if not target.exists():
+            target.write_bytes(buf.getvalue())
+            self.added += 1
+        self.state.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (ref, *version, digest))
+        return target.name
+
+
+def card_image_path(key):
+    path = Path(CARDS_DIR) / f"{key}.png"
+    if not path.exists(): return None
+    if USE_OPTIMIZED_CARDS:
+        optimized = Path(optimize_cards.OUTPUT_DIR) / f"{key}.{optimize_cards.OUTPUT_FORMAT}"
+        if optimized.exists() and optimized.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            return optimized
+    return path
+
+
+def card_media(media, renderer, key):
+    # 卡片文件优先；没有文件时按卡片目录中的坐标从单页图像渲染
+    image_path = card_image_path(key)
+    if image_path: return media.add(image_path)
+    parsed = parse_card_filename(f"{key}.png")
+    if renderer is None or parsed is None or parsed[1] not in renderer.ranges: return None
+    y_start, y_end = parsed[1], renderer.ranges[parsed[1]]
+    return media.add_rendered(f"ref:{y_start}", (renderer.version, y_end),
+                              lambda: renderer.render_range(y_start, y_end))
+
+
+def sync_collection(col, state, media, items, renderer=None, card_ids=None):
+    # 逐条比对字段哈希，只有变化的笔记才写入集合；返回本次引用的媒体和统计
+    now = int(time.time())
+    seen, referenced = set(), []
+    changed = 0
+    card_ids = card_ids or {}
+    for key, sections in items:
+        nid = card_note_id(state, key, card_ids.get(key))
+        seen.add(nid)
+        name = key.rsplit('_', 1)[0] if '_' in key else key
+        media_name = card_media(media, renderer, key)
+        image_field = ""
+        if media_name:
+            referenced.append(media_name)
+            image_field = f'<img src="{media_name}">'
+
+        flds = "\x1f".join([html.escape(name), sections_html(sections), image_field])
+        fields_hash = hashlib.sha1(flds.encode('utf-8')).hexdigest()
+        row = state.execute("SELECT fields_hash FROM notes WHERE nid = ?", (nid,)).fetchone()
+        if row and row[0] == fields_hash:
+            continue
+
+        csum = int(hashlib.sha1(name.encode('utf-8')).hexdigest()[:8], 16)
+        guid = hashlib.sha1(f"{DECK_NAME}:{nid}".encode('utf-8')).hexdigest()[:10]
+        col.execute("""INSERT INTO notes VALUES (?, ?, ?, ?, -1, '', ?, ?, ?, 0, '')
+                       ON CONFLICT(id) DO UPDATE SET mod = excluded.mod, usn = -1, flds = excluded.flds,
+                       sfld = excluded.sfld, csum = excluded.csum""",
+                    (nid, guid, MODEL_ID, now, flds, name, csum))
+        col.execute("INSERT OR IGNORE INTO cards VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+                    (nid, nid, DECK_ID, now, card_sort_key(key)[1] or 0))
+        state.execute("INSERT OR REPLACE INTO notes VALUES (?, ?)", (nid, fields_hash))
+        changed += 1
+
+    # 删除已不存在的卡片
+    stale = [r[0] for r in state.execute("SELECT nid FROM notes") if r[0] not in seen]
+    for nid in stale:
+        col.execute("DELETE FROM cards WHERE nid = ?", (nid,))
+        col.execute("DELETE FROM notes WHERE id = ?", (nid,))
+        state.execute("DELETE FROM notes WHERE nid = ?", (nid,))
+    if changed or stale:
+        col.execute("UPDATE col SET mod = ?", (now * 1000,))
+    return referenced, changed, len(stale)
+
+
+def write_apkg(collection_path, media_dir, media_names, output_file):
+    # 从磁盘流式写入压缩包；PNG 本身已压缩，媒体直接存储不再压缩
+    tmp = f"{output_file}.tmp"
+    unique_names = list(dict.fromkeys(media_names))
+    with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.write(collection_path, "collection.anki2")
+        zf.writestr("media", json.dumps({str(i): n for i, n in enumerate(unique_names)}))
+        for i, name in enumerate(unique_names):
+            zf.write(Path(media_dir) / name, str(i), compress_type=zipfile.ZIP_STORED)
+    os.replace(tmp, output_file)
+    return len(unique_names)
+
+
+def export_apkg(input_file, output_file=None, build_dir=None):
+    # 默认值在调用时读取模块常量，书籍配置中的 OUTPUT_APKG / BUILD_DIR 才能生效
+    output_file = output_file or OUTPUT_APKG
+    build_dir = build_dir or BUILD_DIR
+    start = time.time()
+    build_path = Path(build_dir)
+    build_path.mkdir(parents=True, exist_ok=True)
+    collection_path = build_path / "collection.anki2"
+
+    col = open_collection(collection_path)
+    state = sqlite3.connect(build_path / "state.db")
+    state.executescript(STATE_SCHEMA)
+    media = MediaStore(state, build_path / "media")
+    renderer = CardRenderer() if os.path.exists(CATALOG_FILE) else None
+    try:
+        with col, state:
+            referenced, changed, removed = sync_collection(col, state, media, iter_structure_data(input_file),
+                                                           renderer, load_card_ids())
+    finally:
+        col.close()
+        state.close()
+
+    media_count = write_apkg(collection_path, media.media_dir, referenced, output_file)
+    print(f"成功导出 {output_file}: 更新笔记 {changed} 条，删除 {removed} 条，"
+          f"新增媒体 {media.added} 个 (共 {media_count} 个)，耗时 {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    INPUT_FILENAME = STORE_FILE if os.path.exists(STORE_FILE) else LEGACY_JSON_FILE
+    export_apkg(INPUT_FILENAME)
@@ -0,0 +1,88 @@
+import importlib
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from book_profile import apply_profile, list_profiles, load_profile
+from step6_generate_cards import load_api_key
+
+BOOKS_DIR = "books"
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# 每本书依次执行的步骤 (模块名, 入口函数)；人工审核工具不在批处理范围内
+STAGES = [
+    ("step1_split_pdf", "split_pdf"),
+    ("step2_crop_pages", "main"),
+    ("step3_concat_images", "main"),
+    ("step4_drug_recognition", "main"),
+    ("step5_preprocess_titles", "main"),
+    ("step6_generate_cards", "main"),
+]
+
+
+def run_stage(profile, book_dir, stage_idx, extra):
+    # 在工作进程中执行：切换到该书的输出目录并应用配置，各书输出互不干扰
+    module_name, func_name = STAGES[stage_idx]
+    os.chdir(book_dir)
+    apply_profile(profile, extra)
+    start = time.time()
+    getattr(importlib.import_module(module_name), func_name)()
+    return time.time() - start
+
+
+class Book:
+    def __init__(self, profile_path, base_dir):
+        self.profile = load_profile(profile_path)
+        self.name = self.profile["name"]
+        self.dir = base_dir / BOOKS_DIR / self.name
+        self.dir.mkdir(parents=True, exist_ok=True)
+        pdf = self.profile.get("PDF_PATH", f"{self.name}.pdf")
+        # 相对路径以启动目录为准，poppler 共用一份
+        self.extra = {"PDF_PATH": str((base_dir / pdf).resolve()),
+                      "POPPLER_PATH": str(base_dir / "poppler-25.12.0" / "Library" / "bin")}
+        self.next_stage = 0
+        self.failed = False
+
+
+def run_batch(profile_paths, max_workers=MAX_WORKERS):
+    base_dir = Path.cwd().resolve()
+    books = [Book(p, base_dir) for p in profile_paths]
+    api_key = load_api_key()
+    if api_key: os.environ.setdefault("API_KEY", api_key)
+
+    # 公平调度：每本书同一时刻最多占用一个工作进程，完成一步后排到就绪队列末尾 (轮转)
+    ready = deque(books)
+    running = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while ready or running:
+            while ready and len(running) < max_workers:
+                book = ready.popleft()
+                future = pool.submit(run_stage, book.profile, str(book.dir), book.next_stage, book.extra)
+                running[future] = book
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                book = running.pop(future)
+                stage = STAGES[book.next_stage][0]
+                try:
+                    elapsed = future.result()
+                    print(f"[{book.name}] {stage} 完成，耗时 {elapsed:.1f}s")
+                    book.next_stage += 1
+                    if book.next_stage < len(STAGES): ready.append(book)
+                except Exception as e:
+                    print(f"[{book.name}] {stage} 失败: {e}")
+                    book.failed = True
+
+    for book in books:
+        print(f"{book.name}: {'失败' if book.failed else '完成'} -> {book.dir}")
+
+
+if __name__ == "__main__":
+    # 用法: python batch_runner.py [profiles/a.json profiles/b.json ...]，缺省处理 profiles 目录下全部配置
+    paths = [Path(p) for p in sys.argv[1:]] or list_profiles()
+    if not paths:
+        print("没有找到书籍配置文件")
+    else:
+        run_batch(paths)
@@ -0,0 +1,55 @@
+import importlib
+import json
+import sys
+from pathlib import Path
+import numpy as np
+
+PROFILES_DIR = "profiles"
+
+# 配置文件中的常量会写入下列所有定义了同名常量的模块 (如 COLOR_BLUE 同时作用于 step2 和 step4)
+PIPELINE_MODULES = [
+    "step1_split_pdf", "step2_crop_pages", "step3_concat_images", "step4_drug_recognition",
+    "step5_preprocess_titles", "step6_generate_cards", "card_compaction", "optimize_cards",
+    "structure_prefill", "anki_export",
+]
+# 非模块常量的元信息字段
+META_KEYS = {"name", "description"}
+
+_defaults = {}
+
+
+def load_profile(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    profile.setdefault("name", Path(path).stem)
+    return profile
+
+
+def coerce(default, value):
+    # 按模块中原有常量的类型转换 JSON 值
+    if isinstance(default, np.ndarray): return np.array(value, dtype=default.dtype)
+    if isinstance(default, tuple): return tuple(value)
+    return value
+
+
+def apply_profile(profile, extra=None):
+    # 先恢复上一次修改过的常量，再写入本书配置；同一进程可依次处理多本书
+    modules = [importlib.import_module(m) for m in PIPELINE_MODULES]
+    for (module_name, key), value in _defaults.items():
+        setattr(sys.modules[module_name], key, value)
+
+    overrides = {k: v for k, v in profile.items() if k not in META_KEYS}
+    overrides.update(extra or {})
+    unknown = [k for k in overrides if not any(hasattr(m, k) for m in modules)]
+    if unknown:
+        raise ValueError(f"配置 {profile.get('name')} 中存在未知常量: {', '.join(unknown)}")
+
+    for key, value in overrides.items():
+        for m in modules:
+            if not hasattr(m, key): continue
+            default = _defaults.setdefault((m.__name__, key), getattr(m, key))
+            setattr(m, key, coerce(default, value))
+
+
+def list_profiles(profiles_dir=PROFILES_DIR):
+    return sorted(Path(profiles_dir).glob("*.json"))
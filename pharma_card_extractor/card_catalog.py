@@ -0,0 +1,194 @@
+import bisect
+import json
+import os
+import sqlite3
+from pathlib import Path
+from PIL import Image
+from structure_store import StructureStore
+
+CATALOG_FILE = "card_catalog.db"
+CARDS_DIR = "final_cards"
+PAGES_MANIFEST = "long_image_pages.json"
+STRUCTURE_STORE_FILE = "structure_data.db"
+LEGACY_JSON_FILE = "structure_data.json"
+
+STATUS_PENDING = "pending"      # OCR 完成，尚未人工确认
+STATUS_UNKNOWN = "unknown"      # 标记为识别错误，等待手动命名
+STATUS_CONFIRMED = "confirmed"  # 已人工命名
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+def load_page_offsets(manifest=PAGES_MANIFEST):
+    # 读取 step3 生成的页偏移表，返回按 y 排序的 [(y, page, height)]
+    if not os.path.exists(manifest): return []
+    with open(manifest, 'r', encoding='utf-8') as f:
+        return [(p["y"], p["page"], p["height"]) for p in json.load(f)]
+
+
+def page_at(page_offsets, y):
+    # 长图 y 坐标所在的页码
+    if not page_offsets: return None
+    i = bisect.bisect_right([p[0] for p in page_offsets], y) - 1
+    return page_offsets[max(0, i)][1]
+
+
+def card_filename(name, y_start):
+    return f"{name}_{y_start}.png"
+
+
+def parse_card_filename(path):
+    # "name_y.png" -> (name, y)，无法解析时返回 None
+    stem = Path(path).stem
+    name, _, suffix = stem.rpartition('_')
+    if not name or not suffix.isdigit(): return None
+    return name, int(suffix)
+
+
+class CardCatalog:
+    # 卡片目录：稳定 ID、坐标、页码、OCR 文本、审核状态和人工命名，所有工具共用
+    def __init__(self, path=CATALOG_FILE, cards_dir=CARDS_DIR, manifest=PAGES_MANIFEST):
+        self.cards_dir = Path(cards_dir)
+        self.page_offsets = load_page_offsets(manifest)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                y_start INTEGER NOT NULL UNIQUE,
+                y_end INTEGER NOT NULL,
+                page_start INTEGER,
+                page_end INTEGER,
+                ocr_text TEXT,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                filename TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_cards_status ON cards (status, y_start);
+            CREATE INDEX IF NOT EXISTS idx_cards_pages ON cards (page_start, page_end);
+            CREATE INDEX IF NOT EXISTS idx_cards_name ON cards (name);
+        """)
+
+        # 旧目录首次使用时从文件名导入一次
+        if self.count() == 0 and self.cards_dir.exists():
+            self.sync_from_dir()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def page_span(self, y_start, y_end):
+        return page_at(self.page_offsets, y_start), page_at(self.page_offsets, max(y_start, y_end - 1))
+
+    def upsert_card(self, y_start, y_end, name, ocr_text=None, status=STATUS_PENDING, filename=None, commit=True):
+        # 以 y_start 作为卡片的自然键，重跑 step6 时保留原有 ID；人工确认过的名称和状态不被 OCR 结果覆盖
+        old = self.get_by_y(y_start)
+        if old is not None and old["status"] == STATUS_CONFIRMED:
+            name, status = old["name"], old["status"]
+            if filename: filename = card_filename(name, y_start)
+        page_start, page_end = self.page_span(y_start, y_end)
+        self.conn.execute("""
+            INSERT INTO cards (y_start, y_end, page_start, page_end, ocr_text, name, status, filename)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(y_start) DO UPDATE SET
+                y_end = excluded.y_end, page_start = excluded.page_start, page_end = excluded.page_end,
+                ocr_text = excluded.ocr_text, name = excluded.name, status = excluded.status,
+                filename = excluded.filename""",
+                          (y_start, y_end, page_start, page_end, ocr_text, name, status, filename))
+        if commit: self.conn.commit()
+
+        # 名称变化时旧文件失效，structure_data 中的键随之迁移
+        if old is not None:
+            if old["filename"] and old["filename"] != filename and self.path(old).exists():
+                self.path(old).unlink()
+            self.migrate_key(self.key(old), f"{name}_{y_start}")
+        return self.get_by_y(y_start)["id"]
+
+    def sync_from_dir(self):
+        parsed = sorted((p[1], p[0], f) for f in self.cards_dir.glob("*.png") if (p := parse_card_filename(f)))
+        for i, (y, name, f) in enumerate(parsed):
+            if i < len(parsed) - 1:
+                y_end = parsed[i + 1][0]
+            else:
+                with Image.open(f) as img: y_end = y + img.height
+            status = STATUS_UNKNOWN if name.lower() == "unknown" else STATUS_PENDING
+            self.upsert_card(y, y_end, name, status=status, filename=f.name, commit=False)
+        self.conn.commit()
+
+    def cards(self, status=None, exclude_status=None, page_range=None, name=None):
+        # 按 y 顺序返回满足条件的卡片；page_range 为闭区间，与卡片页码范围相交即命中
+        sql, args = "SELECT * FROM cards WHERE 1 = 1", []
+        if status is not None:
+            sql += " AND status = ?"; args.append(status)
+        if exclude_status is not None:
+            sql += " AND status != ?"; args.append(exclude_status)
+        if page_range is not None:
+            sql += " AND page_start <= ? AND page_end >= ?"; args += [page_range[1], page_range[0]]
+        if name is not None:
+            sql += " AND name = ?"; args.append(name)
+        return self.conn.execute(sql + " ORDER BY y_start", args).fetchall()
+
+    def get(self, card_id):
+        return self.conn.execute("SELECT * FROM cards WHERE id = ?", (card_id,)).fetchone()
+
+    def get_by_y(self, y_start):
+        return self.conn.execute("SELECT * FROM cards WHERE y_start = ?", (y_start,)).fetchone()
+
+    def prune(self, y_starts):
+        # 删除不在本次检测结果中的卡片 (如在标题网格中判为误检的)，连同卡片文件；返回删除数量
+        keep = set(y_starts)
+        stale = [c for c in self.cards() if c["y_start"] not in keep]
+        for card in stale:
+            if card["filename"] and self.path(card).exists():
+                self.path(card).unlink()
+        with self.conn:
+            self.conn.executemany("DELETE FROM cards WHERE id = ?", [(c["id"],) for c in stale])
+        return len(stale)
+
+    def path(self, card):
+        # 引用卡片 (filename 为空) 返回约定的文件名，由 card_render 按需生成像素
+        return self.cards_dir / (card["filename"] or card_filename(card["name"], card["y_start"]))
+
+    @staticmethod
+    def key(card):
+        # 与 structure_data 中的键一致
+        return f"{card['name']}_{card['y_start']}"
+
+    def set_status(self, card_id, status):
+        with self.conn:
+            self.conn.execute("UPDATE cards SET status = ? WHERE id = ?", (status, card_id))
+
+    def rename(self, card_id, name, status=STATUS_CONFIRMED):
+        # 同步改名：卡片文件、目录记录和 structure_data 中的键；引用卡片只改记录
+        card = self.get(card_id)
+        new_filename = card_filename(name, card["y_start"]) if card["filename"] else None
+        if new_filename and card["filename"] != new_filename and self.path(card).exists():
+            os.replace(self.path(card), self.cards_dir / new_filename)
+        with self.conn:
+            self.conn.execute("UPDATE cards SET name = ?, status = ?, filename = ? WHERE id = ?",
+                              (name, status, new_filename, card_id))
+        self.migrate_key(self.key(card), f"{name}_{card['y_start']}")
+
+    def set_bounds(self, card_id, y_start, y_end):
+        # 调整卡片边界：已落盘的卡片像素随之失效，删除文件后转为引用卡片
+        card = self.get(card_id)
+        page_start, page_end = self.page_span(y_start, y_end)
+        with self.conn:
+            self.conn.execute("""UPDATE cards SET y_start = ?, y_end = ?, page_start = ?, page_end = ?, filename = NULL
+                                 WHERE id = ?""", (y_start, y_end, page_start, page_end, card_id))
+        # 更新成功 (y_start 未与其他卡片冲突) 后再删除旧文件
+        if card["filename"] and self.path(card).exists():
+            self.path(card).unlink()
+        self.migrate_key(self.key(card), f"{card['name']}_{y_start}")
+
+    def migrate_key(self, old_key, new_key):
+        # 只有旧版 JSON 时先导入再改键，否则之后导入时数据仍挂在旧名称下
+        if old_key == new_key: return
+        if not os.path.exists(STRUCTURE_STORE_FILE) and not os.path.exists(LEGACY_JSON_FILE): return
+        store = StructureStore(STRUCTURE_STORE_FILE, legacy_json=LEGACY_JSON_FILE)
+        if old_key in store and new_key not in store:
+            store.rename(old_key, new_key)
+        store.conn.close()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+from card_catalog import CardCatalog, load_page_offsets
+
+CARDS_DIR = "final_cards"
+MAX_BLANK_RUN = 40         # 连续空白行超过该高度时压缩到该高度
+SEAM_GAP = 12              # 跨页接缝处的空白 (上页下边距 + 下页上边距) 压缩到该高度
+BLANK_THRESHOLD = 240      # 灰度低于该值视为有内容
+COMPACTED_KEY = "compacted"  # 写入 PNG 文本块，避免重复压缩时接缝位置错位
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+def row_occupancy(gray):
+    # 行占用剖面：该行是否存在非空白像素
+    return np.any(gray < BLANK_THRESHOLD, axis=1)
+
+
+def blank_runs(occupied):
+    # 空白段的 [start, end) 区间
+    padded = np.concatenate(([False], ~occupied, [False]))
+    diff = np.diff(padded.astype(np.int8))
+    return np.flatnonzero(diff == 1), np.flatnonzero(diff == -1)
+
+
+def compaction_mask(occupied, seams=(), max_run=None, seam_gap=None):
+    # 返回保留行的布尔掩码：普通空白段保留 max_run 行，包含或紧邻页接缝的空白段保留 seam_gap 行
+    # 默认值在调用时读取模块常量，书籍配置的覆盖才能生效
+    if max_run is None: max_run = MAX_BLANK_RUN
+    if seam_gap is None: seam_gap = SEAM_GAP
+    starts, ends = blank_runs(occupied)
+    limits = np.full(len(starts), max_run)
+    seams = np.asarray(seams, dtype=np.int64)
+    if len(seams) and len(starts):
+        has_seam = ((seams[None, :] >= starts[:, None]) & (seams[None, :] <= ends[:, None])).any(axis=1)
+        limits[has_seam] = np.minimum(limits[has_seam], seam_gap)
+
+    cut_starts = starts + limits
+    cut = cut_starts < ends
+    delta = np.zeros(len(occupied) + 1, dtype=np.int32)
+    np.add.at(delta, cut_starts[cut], 1)
+    np.add.at(delta, ends[cut], -1)
+    return np.cumsum(delta[:-1]) == 0
+
+
+def take_rows(img, keep):
+    if keep.all(): return img
+    out = Image.fromarray(np.asarray(img)[keep])
+    if img.mode == "P":
+        out.putpalette(img.getpalette())
+    return out
+
+
+def local_seams(page_offsets, y_start, height):
+    # 落在卡片内部的页起点，换算为卡片内坐标
+    ys = np.array([p[0] for p in page_offsets], dtype=np.int64)
+    ys = ys - y_start
+    return ys[(ys > 0) & (ys < height)]
+
+
+def compact_card(path, y_start, page_offsets):
+    try:
+        with Image.open(path) as img:
+            if img.info.get(COMPACTED_KEY): return path, None, None
+            img.load()
+            before = img.height
+            seams = local_seams(page_offsets, y_start, img.height)
+            keep = compaction_mask(row_occupancy(np.asarray(img.convert("L"))), seams)
+            out = take_rows(img, keep)
+
+        meta = PngInfo()
+        meta.add_text(COMPACTED_KEY, "1")
+        tmp = f"{path}.tmp"
+        out.save(tmp, format="PNG", pnginfo=meta)
+        os.replace(tmp, path)
+        return path, before, out.height
+    except Exception as e:
+        print(f"处理失败 {path}: {e}")
+        return path, None, None
+
+
+def main():
+    catalog = CardCatalog(cards_dir=CARDS_DIR)
+    cards = [c for c in catalog.cards() if c["filename"] and catalog.path(c).exists()]
+    paths = [str(catalog.path(c)) for c in cards]
+    catalog.close()
+    page_offsets = load_page_offsets()
+
+    total_before = total_after = 0
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = pool.map(compact_card, paths, [c["y_start"] for c in cards],
+                           [page_offsets] * len(cards), chunksize=8)
+        for path, before, after in results:
+            if before is None: continue
+            total_before += before
+            total_after += after
+
+    if total_before:
+        print(f"压缩完成: 总高度 {total_before}px -> {total_after}px (减少 {1 - total_after / total_before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import bisect
+import math
+import os
+from pathlib import Path
+from PIL import Image
+from card_catalog import CardCatalog, CATALOG_FILE, PAGES_MANIFEST, load_page_offsets, parse_card_filename
+from image_cache import LRUImageCache, fit_image, load_image
+
+PAGES_DIR = "cropped_pages_clean"
+PAGE_CACHE_BYTES = 192 * 1024 * 1024
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+class PageRenderer:
+    # 按页偏移表从单页图像拼出长图的任意区间，不解码整张长图；单页解码结果按字节数 LRU 缓存
+    def __init__(self, pages_dir=PAGES_DIR, manifest=PAGES_MANIFEST, cache_bytes=PAGE_CACHE_BYTES):
+        self.pages_dir = Path(pages_dir)
+        self.pages = load_page_offsets(manifest)
+        # 页偏移表变化 (重新拼接) 后引用卡片的像素随之变化，导出缓存以此区分版本
+        self.version = os.stat(manifest).st_mtime_ns if os.path.exists(manifest) else 0
+        self.page_starts = [p[0] for p in self.pages]
+        self.cache = LRUImageCache(cache_bytes)
+        self._width = None
+
+    def available(self):
+        return bool(self.pages) and all((self.pages_dir / f"{page}.png").exists() for _, page, _ in self.pages)
+
+    @property
+    def height(self):
+        return self.pages[-1][0] + self.pages[-1][2] if self.pages else 0
+
+    @property
+    def width(self):
+        # 与 step3 长图一致：画布宽度取所有页的最大宽度
+        if self._width is None:
+            widths = []
+            for _, page, _ in self.pages:
+                with Image.open(self.pages_dir / f"{page}.png") as img:
+                    widths.append(img.width)
+            self._width = max(widths)
+        return self._width
+
+    def page_image(self, page):
+        img = self.cache.get(page)
+        if img is None:
+            img = load_image(self.pages_dir / f"{page}.png")
+            self.cache.put(page, img)
+        return img
+
+    def render_range(self, y_start, y_end):
+        # 长图 [y_start, y_end) 区间：逐页裁剪后拼接，只解码涉及的页
+        canvas = Image.new('RGB', (self.width, y_end - y_start), color=(255, 255, 255))
+        i = max(0, bisect.bisect_right(self.page_starts, y_start) - 1)
+        while i < len(self.pages) and self.pages[i][0] < y_end:
+            page_y, page, height = self.pages[i]
+            top, bottom = max(y_start, page_y), min(y_end, page_y + height)
+            if top < bottom:
+                img = self.page_image(page)
+                canvas.paste(img.crop((0, top - page_y, img.width, bottom - page_y)), (0, top - y_start))
+            i += 1
+        return canvas
+
+
+class CardRenderer(PageRenderer):
+    # 引用卡片 (只在目录中记录坐标，不落盘) 按需从单页图像拼出像素；磁盘上已有卡片文件时直接读取
+    def __init__(self, catalog_file=CATALOG_FILE, pages_dir=PAGES_DIR, manifest=PAGES_MANIFEST,
+                 cache_bytes=PAGE_CACHE_BYTES):
+        super().__init__(pages_dir, manifest, cache_bytes)
+        self.catalog_file = catalog_file
+        self.refresh()
+
+    def refresh(self):
+        # 重新读取卡片坐标；在后台线程中调用时也只用临时连接
+        catalog = CardCatalog(self.catalog_file)
+        self.ranges = {c["y_start"]: c["y_end"] for c in catalog.cards()}
+        catalog.close()
+
+    def card_range(self, path):
+        parsed = parse_card_filename(path)
+        if parsed is None: raise FileNotFoundError(path)
+        y_start = parsed[1]
+        if y_start not in self.ranges: self.refresh()
+        if y_start not in self.ranges: raise FileNotFoundError(path)
+        return y_start, self.ranges[y_start]
+
+    def size(self, path):
+        # 卡片尺寸：已落盘的读文件头，引用卡片取页宽和目录中的 y 范围，都不解码像素
+        if Path(path).exists():
+            with Image.open(path) as img:
+                return img.size
+        y_start, y_end = self.card_range(path)
+        return self.width, y_end - y_start
+
+    def open(self, path):
+        # 完整卡片图像
+        if Path(path).exists(): return load_image(path)
+        return self.render_range(*self.card_range(path))
+
+    def fit(self, path, width, max_height=None):
+        # 与 image_cache.fit_image 相同的缩放规则；引用卡片只渲染可见部分
+        if Path(path).exists(): return fit_image(path, width, max_height)
+        y_start, y_end = self.card_range(path)
+        ratio = width / self.width
+        out_h = max(1, int((y_end - y_start) * ratio))
+        if max_height is not None:
+            out_h = min(out_h, max_height)
+        src_h = min(y_end - y_start, math.ceil(out_h / ratio))
+        img = self.render_range(y_start, y_start + src_h)
+        return img.resize((width, out_h), Image.Resampling.LANCZOS, box=(0, 0, img.width, min(src_h, out_h / ratio)))
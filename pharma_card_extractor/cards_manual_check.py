@@ -1,17 +1,22 @@
-import os
 import tkinter as tk
-from PIL import Image, ImageTk
-from pathlib import Path
+from PIL import ImageTk
+from image_cache import ImagePrefetcher
+from card_render import CardRenderer
+from card_catalog import CardCatalog, STATUS_UNKNOWN
 
 OUTPUT_CARDS_DIR = "final_cards"
+DISPLAY_WIDTH, DISPLAY_MAX_HEIGHT = 860, 550
 
 
 class VisualChecker:
     def __init__(self, root):
         self.root = root
-        self.directory = Path(OUTPUT_CARDS_DIR)
-        self.files = self.get_valid_files()
+        self.catalog = CardCatalog(cards_dir=OUTPUT_CARDS_DIR)
+        self.cards = self.get_valid_cards()
+        self.files = [self.catalog.path(c) for c in self.cards]
         self.current_index = 0
+        self.renderer = CardRenderer()
+        self.loader = ImagePrefetcher(lambda f: self.renderer.fit(f, DISPLAY_WIDTH, DISPLAY_MAX_HEIGHT))
 
         self.img_label = tk.Label(root, bg="#f0f0f0")
         self.img_label.pack(expand=True, fill="both")
@@ -23,23 +28,17 @@ class VisualChecker:
         root.bind('<Return>', self.mark_as_unknown)
         self.load_image()
 
-    def get_valid_files(self):
-        files = [f for f in self.directory.glob("*.png") if not f.name.lower().startswith("unknown")]
-        files.sort(key=lambda f: int(f.stem.split('_')[-1]) if '_' in f.stem else 0)
-        return files
+    def get_valid_cards(self):
+        return self.catalog.cards(exclude_status=STATUS_UNKNOWN)
 
     def load_image(self):
         if not self.files: self.root.destroy(); return
         current_file = self.files[self.current_index]
-        self.filename_label.config(text=current_file.stem.rsplit('_', 1)[0])
+        self.filename_label.config(text=self.cards[self.current_index]["name"])
 
-        img = Image.open(current_file)
-        ratio = 860 / img.size[0]
-        img = img.resize((860, int(img.size[1] * ratio)), Image.Resampling.LANCZOS)
-        if img.size[1] > 550: img = img.crop((0, 0, 860, 550))
-
-        self.tk_image = ImageTk.PhotoImage(img)
+        self.tk_image = ImageTk.PhotoImage(self.loader.get(current_file))
         self.img_label.config(image=self.tk_image)
+        self.loader.prefetch_around(self.files, self.current_index)
 
     def next_image(self, event=None):
         if self.current_index < len(self.files) - 1:
@@ -52,9 +51,9 @@ class VisualChecker:
             self.load_image()
 
     def mark_as_unknown(self, event=None):
-        f = self.files[self.current_index]
-        new_path = f.parent / f"Unknown_{f.name.split('_')[-1]}"
-        os.rename(f, new_path)
+        card = self.cards[self.current_index]
+        self.catalog.rename(card["id"], "Unknown", status=STATUS_UNKNOWN)
+        del self.cards[self.current_index]
         del self.files[self.current_index]
         self.load_image()
 
@@ -62,4 +61,5 @@ class VisualChecker:
 if __name__ == "__main__":
     root = tk.Tk()
     app = VisualChecker(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.loader.shutdown()
\ No newline at end of file
@@ -1,19 +1,23 @@
-import os
 import tkinter as tk
 import re
-from PIL import Image, ImageTk
-from pathlib import Path
+from PIL import ImageTk
+from image_cache import ImagePrefetcher
+from card_render import CardRenderer
+from card_catalog import CardCatalog, STATUS_UNKNOWN
 
 OUTPUT_CARDS_DIR = "final_cards"
+DISPLAY_WIDTH, DISPLAY_MAX_HEIGHT = 780, 500
 
 
 class ManualRenamer:
     def __init__(self, root):
         self.root = root
-        self.directory = Path(OUTPUT_CARDS_DIR)
-        self.files = sorted(list(self.directory.glob("Unknown_*.png")),
-                            key=lambda f: int(f.stem.split('_')[-1]) if '_' in f.stem else 0)
+        self.catalog = CardCatalog(cards_dir=OUTPUT_CARDS_DIR)
+        self.cards = self.catalog.cards(status=STATUS_UNKNOWN)
+        self.files = [self.catalog.path(c) for c in self.cards]
         self.current_index = 0
+        self.renderer = CardRenderer()
+        self.loader = ImagePrefetcher(lambda f: self.renderer.fit(f, DISPLAY_WIDTH, DISPLAY_MAX_HEIGHT))
 
         self.img_label = tk.Label(root, bg="#f0f0f0")
         self.img_label.pack(expand=True, fill="both")
@@ -25,21 +29,16 @@ class ManualRenamer:
 
     def load_image(self):
         if self.current_index >= len(self.files): self.root.destroy(); return
-        img = Image.open(self.files[self.current_index])
-        ratio = 780 / img.size[0]
-        img = img.resize((780, int(img.size[1] * ratio)), Image.Resampling.LANCZOS)
-        if img.size[1] > 500: img = img.crop((0, 0, 780, 500))
-
-        self.tk_image = ImageTk.PhotoImage(img)
+        self.tk_image = ImageTk.PhotoImage(self.loader.get(self.files[self.current_index]))
         self.img_label.config(image=self.tk_image)
+        self.loader.prefetch_around(self.files, self.current_index)
         self.input_var.set("");
         self.entry.focus_set()
 
     def on_rename(self, event=None):
         name = re.sub(r'[\\/:*?"<>|]', '_', self.input_var.get().strip())
         if not name: return
-        f = self.files[self.current_index]
-        os.rename(f, f.parent / f"{name}_{f.name.split('_')[-1]}")
+        self.catalog.rename(self.cards[self.current_index]["id"], name)
         self.current_index += 1;
         self.load_image()
 
@@ -47,4 +46,5 @@ class ManualRenamer:
 if __name__ == "__main__":
     root = tk.Tk();
     app = ManualRenamer(root);
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.loader.shutdown()
\ No newline at end of file
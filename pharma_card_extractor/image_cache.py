@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+PREFETCH_RADIUS = 4
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+WORKER_COUNT = 2
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+def image_nbytes(img):
+    # 估算解码后位图占用的内存
+    return img.width * img.height * len(img.getbands())
+
+
+def load_image(path):
+    # 原图解码，不做缩放
+    with Image.open(path) as img:
+        img.load()
+        return img.copy()
+
+
+def fit_image(path, width, max_height=None):
+    # 缩放到指定宽度；超出 max_height 的部分在缩放前就不参与计算
+    with Image.open(path) as img:
+        ratio = width / img.width
+        out_h = max(1, int(img.height * ratio))
+        if max_height is not None:
+            out_h = min(out_h, max_height)
+        src_h = min(img.height, out_h / ratio)
+        return img.resize((width, out_h), Image.Resampling.LANCZOS, box=(0, 0, img.width, src_h))
+
+
+class LRUImageCache:
+    # 按字节数限制容量的 LRU 缓存，线程安全
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            img = self.items.get(key)
+            if img is not None:
+                self.items.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        size = image_nbytes(img)
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= image_nbytes(old)
+            self.items[key] = img
+            self.total_bytes += size
+            # 淘汰最久未使用的条目，至少保留刚放入的一张
+            while self.total_bytes > self.max_bytes and len(self.items) > 1:
+                _, evicted = self.items.popitem(last=False)
+                self.total_bytes -= image_nbytes(evicted)
+
+    def discard(self, key):
+        with self.lock:
+            img = self.items.pop(key, None)
+            if img is not None:
+                self.total_bytes -= image_nbytes(img)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+
+class ImagePrefetcher:
+    # 后台线程预解码前后若干张图片，按键时直接从缓存取
+    def __init__(self, render, radius=PREFETCH_RADIUS, max_bytes=CACHE_MAX_BYTES, workers=WORKER_COUNT):
+        self.render = render
+        self.radius = radius
+        self.cache = LRUImageCache(max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _load(self, key):
+        img = self.render(key)
+        self.cache.put(key, img)
+        with self.lock:
+            self.pending.pop(key, None)
+        return img
+
+    def get(self, key):
+        img = self.cache.get(key)
+        if img is not None:
+            return img
+        with self.lock:
+            future = self.pending.get(key)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._load(key)
+
+    def prefetch_around(self, keys, index):
+        # 由近及远排队，优先下一张；窗口外尚未开始的任务直接取消
+        window = []
+        for d in range(1, self.radius + 1):
+            for i in (index + d, index - d):
+                if 0 <= i < len(keys):
+                    window.append(keys[i])
+        wanted = set(window)
+
+        with self.lock:
+            for key, future in list(self.pending.items()):
+                if key not in wanted and future.cancel():
+                    del self.pending[key]
+            for key in window:
+                if key in self.pending or key in self.cache:
+                    continue
+                self.pending[key] = self.executor.submit(self._load, key)
+
+    def invalidate(self, key):
+        self.cache.discard(key)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
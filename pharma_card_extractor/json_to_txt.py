@@ -1,5 +1,7 @@
 import json
 import os
+import sqlite3
+from structure_store import iter_structure_data
 
 
 def convert_json_to_txt(input_file, output_file):
@@ -9,14 +11,10 @@ def convert_json_to_txt(input_file, output_file):
         return
 
     try:
-        # 读取 JSON 文件
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
         lines = []
 
-        # 遍历 JSON 数据
-        for key, value_list in data.items():
+        # 逐条读取数据 (SQLite 存储或 JSON 文件)
+        for key, value_list in iter_structure_data(input_file):
             # 1. 处理标题：去除下划线后的 ID (例如: "乙酰胆碱_156169" -> "乙酰胆碱")
             # 如果 key 中没有下划线，则保留原样
             clean_name = key.split('_')[0] if '_' in key else key
@@ -48,13 +46,16 @@ def convert_json_to_txt(input_file, output_file):
 
     except json.JSONDecodeError:
         print(f"错误: {input_file} 不是有效的 JSON 格式。")
+    except sqlite3.DatabaseError:
+        print(f"错误: {input_file} 不是有效的数据库文件。")
     except Exception as e:
         print(f"发生未知错误: {e}")
 
 
 if __name__ == "__main__":
     # 配置输入和输出文件名
-    INPUT_FILENAME = 'structure_data.json'
+    # 优先读取 manual_structure 的 SQLite 存储，没有时回退到 JSON
+    INPUT_FILENAME = 'structure_data.db' if os.path.exists('structure_data.db') else 'structure_data.json'
     OUTPUT_FILENAME = 'human_readable_structure.txt'
 
     convert_json_to_txt(INPUT_FILENAME, OUTPUT_FILENAME)
\ No newline at end of file
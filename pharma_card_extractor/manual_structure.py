@@ -4,14 +4,21 @@ from PIL import Image, ImageTk
 from pathlib import Path
 import json
 import os
+import time
+from tile_pyramid import TilePyramid, new_level_cache, new_tile_cache
+from structure_store import StructureStore
+from card_catalog import CardCatalog
+from card_render import CardRenderer
 
 # 配置
 IMAGE_DIR = "final_cards"
 DATA_FILE = "structure_data.json"
+STORE_FILE = "structure_data.db"
 PRESET_FILE = "structure_presets.json"
 WINDOW_WIDTH = 1400
 WINDOW_HEIGHT = 900
 LEFT_PANEL_WIDTH = 750  # 图片区域默认宽度
+MIN_ZOOM, MAX_ZOOM, ZOOM_STEP = 0.25, 4.0, 1.25
 Image.MAX_IMAGE_PIXELS = None
 
 
@@ -72,14 +79,26 @@ class StructureExtractor:
         self.files = self.get_file_list()
         self.current_idx = 0
         self.zoom_level = 1.0
-
-        # 数据加载
-        self.data = self.load_json(DATA_FILE)
+        self.pyramid = None
+        self.tile_cache = new_tile_cache()
+        self.level_cache = new_level_cache()
+        self.renderer = CardRenderer()
+        self.tile_items = {}
+
+        # 数据加载：data 只缓存浏览过的卡片，dirty 记录待写入的卡片
+        self.store = StructureStore(STORE_FILE, legacy_json=DATA_FILE)
+        self.store.ensure_keys(f.stem for f in self.files)
+        self.data = {}
+        self.dirty = set()
+        # 录入速度统计 (张/分钟)
+        self.session_start = time.time()
+        self.saved_count = 0
         self.presets = self.load_json(PRESET_FILE)
 
         # 初始化UI
         self.setup_ui()
         self.bind_keys()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         if self.files:
             self.load_current_card()
@@ -87,15 +106,10 @@ class StructureExtractor:
             self.root.after(100, lambda: messagebox.showinfo("提示", f"{IMAGE_DIR} 目录下没有找到 png 图片"))
 
     def get_file_list(self):
-        if not self.image_dir.exists():
-            return []
-        files = list(self.image_dir.glob("*.png"))
-        try:
-            # 优先按数字后缀排序
-            files.sort(key=lambda x: int(x.stem.split('_')[-1]) if '_' in x.stem and x.stem.split('_')[
-                -1].isdigit() else x.name)
-        except:
-            files.sort(key=lambda x: x.name)
+        # 卡片顺序和文件名来自卡片目录，不再扫描目录
+        catalog = CardCatalog(cards_dir=IMAGE_DIR)
+        files = [catalog.path(c) for c in catalog.cards()]
+        catalog.close()
         return files
 
     def load_json(self, filename):
@@ -109,41 +123,24 @@ class StructureExtractor:
 
     def save_data(self):
         """
-        保存数据到JSON文件。
+        保存数据到 SQLite 存储。
         改进逻辑：
-        1. 自动将所有未录入的文件补全为 []
-        2. 按照数字顺序 (drug_2 < drug_10) 对 Key 进行排序
+        1. 只写入有改动的卡片，单事务提交，中途崩溃不会损坏已有数据
+        2. 补全和排序由存储层负责 (启动时补全，导出时按数字顺序输出)
         """
-        # 1. 补全：确保目录下的所有文件都在 data 中
-        if self.files:
-            for f in self.files:
-                if f.stem not in self.data:
-                    self.data[f.stem] = []
-
-        # 2. 排序：定义排序 Key 函数
-        def sort_key(item):
-            key = item[0]
-            # 尝试分割 "drug_10" 提取数字 10
-            if '_' in key:
-                parts = key.split('_')
-                if parts[-1].isdigit():
-                    # 优先级 0: 能够提取出数字的，按数字大小排序
-                    return (0, int(parts[-1]))
-
-            # 优先级 1: 无法提取数字的，按文件名原本的字符串排序
-            return (1, key)
-
-        # 执行排序
-        try:
-            sorted_items = sorted(self.data.items(), key=sort_key)
-            self.data = dict(sorted_items)
-        except Exception as e:
-            print(f"排序时发生非致命错误: {e}")
-            # 如果排序失败，保持原样，避免丢失数据
+        if not self.dirty:
+            return
+        self.store.put_many((key, self.data[key]) for key in self.dirty)
+        self.dirty.clear()
 
-        # 3. 写入文件
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+    def on_close(self):
+        # 退出时导出一份 JSON，供仍读取 structure_data.json 的工具使用
+        self.save_data()
+        try:
+            self.store.export_json(DATA_FILE)
+        finally:
+            self.store.close()
+            self.root.destroy()
 
     def save_presets(self):
         with open(PRESET_FILE, 'w', encoding='utf-8') as f:
@@ -162,7 +159,8 @@ class StructureExtractor:
         self.canvas = tk.Canvas(self.left_frame, bg="#333")
         self.v_scroll = ttk.Scrollbar(self.left_frame, orient="vertical", command=self.canvas.yview)
         self.h_scroll = ttk.Scrollbar(self.left_frame, orient="horizontal", command=self.canvas.xview)
-        self.canvas.configure(yscrollcommand=self.v_scroll.set, xscrollcommand=self.h_scroll.set)
+        self.canvas.configure(yscrollcommand=self._on_yscroll, xscrollcommand=self._on_xscroll)
+        self.canvas.bind("<Configure>", lambda e: self.render_visible_tiles())
 
         self.v_scroll.pack(side="right", fill="y")
         self.h_scroll.pack(side="bottom", fill="x")
@@ -204,7 +202,7 @@ class StructureExtractor:
         self.preset_label = tk.Label(self.status_frame, text="", bg="#e0e0e0", font=("Arial", 9))
         self.preset_label.pack(side="left", padx=10)
 
-        tk.Label(self.status_frame, text="Ctrl+X: 清空当前 | Enter: 保存并下一个", bg="#e0e0e0", fg="blue").pack(
+        tk.Label(self.status_frame, text="Ctrl+X: 清空当前 | Enter: 保存并下一个 | Ctrl+滚轮: 缩放", bg="#e0e0e0", fg="blue").pack(
             side="right", padx=10)
 
         self.update_preset_labels()
@@ -223,6 +221,7 @@ class StructureExtractor:
         self.root.bind("<Return>", self.save_and_next)
         self.root.bind("<Control-x>", self.clear_current_data)
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind_all("<Control-MouseWheel>", self._on_zoom)
 
         for i in range(1, 10):
             self.root.bind(f"{i}", lambda event, idx=i: self.add_h1_by_preset(idx))
@@ -232,6 +231,54 @@ class StructureExtractor:
     def _on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
 
+    def _on_yscroll(self, first, last):
+        self.v_scroll.set(first, last)
+        self.render_visible_tiles()
+
+    def _on_xscroll(self, first, last):
+        self.h_scroll.set(first, last)
+        self.render_visible_tiles()
+
+    def _on_zoom(self, event):
+        factor = ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, self.zoom_level * factor))
+        if zoom == self.zoom_level or not self.pyramid: return
+        # 以当前视口顶部为锚点缩放
+        top = self.canvas.yview()[0]
+        self.zoom_level = zoom
+        self.reset_canvas()
+        self.canvas.yview_moveto(top)
+
+    def display_scale(self):
+        return LEFT_PANEL_WIDTH * self.zoom_level / self.pyramid.width
+
+    def reset_canvas(self):
+        w, h = self.pyramid.display_size(self.display_scale())
+        self.canvas.delete("all")
+        self.tile_items.clear()
+        self.canvas.config(scrollregion=(0, 0, w, h))
+
+    def render_visible_tiles(self):
+        # 只为视口内的瓦片创建 PhotoImage，移出视口的立即释放
+        if not self.pyramid: return
+        scale = self.display_scale()
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        right = left + self.canvas.winfo_width()
+        bottom = top + self.canvas.winfo_height()
+        visible = set(self.pyramid.visible_tiles(scale, left, top, right, bottom))
+
+        for pos in list(self.tile_items):
+            if pos not in visible:
+                item_id, _ = self.tile_items.pop(pos)
+                self.canvas.delete(item_id)
+
+        size = self.pyramid.tile_size
+        for col, row in visible:
+            if (col, row) in self.tile_items: continue
+            tk_tile = ImageTk.PhotoImage(self.pyramid.tile(scale, col, row))
+            item_id = self.canvas.create_image(col * size, row * size, anchor="nw", image=tk_tile)
+            self.tile_items[(col, row)] = (item_id, tk_tile)
+
     def load_current_card(self):
         if not self.files: return
 
@@ -239,27 +286,24 @@ class StructureExtractor:
         fpath = self.files[self.current_idx]
         self.current_filename = fpath.stem
 
-        self.info_label.config(text=f"[{self.current_idx + 1}/{len(self.files)}] {fpath.name}")
+        self.info_label.config(text=f"[{self.current_idx + 1}/{len(self.files)}] {fpath.name}  {self.throughput_text()}")
 
         try:
-            img = Image.open(fpath)
-            base_width = LEFT_PANEL_WIDTH
-            w_percent = (base_width / float(img.size[0]))
-            h_size = int((float(img.size[1]) * float(w_percent)))
-            img_resized = img.resize((base_width, h_size), Image.Resampling.LANCZOS)
-
-            self.tk_img = ImageTk.PhotoImage(img_resized)
-            self.canvas.config(scrollregion=(0, 0, base_width, h_size))
-            self.canvas.delete("all")
-            self.canvas.create_image(0, 0, anchor="nw", image=self.tk_img)
+            # 尺寸不解码即可得到，原图只在可见瓦片未命中缓存时才解码
+            self.pyramid = TilePyramid(fpath, self.tile_cache, self.level_cache, size=self.renderer.size(fpath),
+                                       loader=lambda path=fpath: self.renderer.open(path))
+            self.reset_canvas()
+            self.canvas.xview_moveto(0)
             self.canvas.yview_moveto(0)
+            self.render_visible_tiles()
         except Exception as e:
+            self.pyramid = None
             messagebox.showerror("图片加载错误", f"无法加载图片: {e}")
 
         # 2. 加载或初始化数据结构
         # 如果当前文件在内存中尚未存在，直接初始化为空列表，确保它"占位"
         if self.current_filename not in self.data:
-            self.data[self.current_filename] = []
+            self.data[self.current_filename] = self.store.get(self.current_filename, [])
 
         self.current_struct = self.data[self.current_filename]
         self.refresh_tree()
@@ -287,7 +331,7 @@ class StructureExtractor:
 
         if messagebox.askyesno("确认操作", "确定要清空当前图片的所有录入信息吗？\n此操作不可撤销。"):
             self.current_struct.clear()  # 直接清空列表对象
-            # 不需要重新赋值给 self.data，因为列表是引用传递
+            self.save_current_struct_memory()
             self.refresh_tree()
 
             current_text = self.preset_label.cget("text")
@@ -345,13 +389,20 @@ class StructureExtractor:
             self.refresh_tree()
 
     def save_current_struct_memory(self):
-        # 显式更新内存（虽然 self.current_struct 引用通常已足够，但为了保险起见）
+        # 显式更新内存，并标记为待写入
         self.data[self.current_filename] = self.current_struct
+        self.dirty.add(self.current_filename)
+
+    def throughput_text(self):
+        minutes = (time.time() - self.session_start) / 60
+        if not self.saved_count or minutes <= 0: return ""
+        return f"({self.saved_count / minutes:.1f} 张/分钟)"
 
     def save_and_next(self, event=None):
         """保存并跳转下一张"""
         self.save_current_struct_memory()  # 确保当前改动已同步
-        self.save_data()  # 触发补全、排序和写入硬盘
+        self.saved_count += 1
+        self.save_data()  # 增量写入硬盘
         self.next_card()
 
     def next_card(self, event=None):
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+from card_catalog import CardCatalog, STATUS_CONFIRMED
+
+DICTIONARY_FILE = "drug_dictionary.txt"   # 可选：每行一个药名，补充词典
+CORRECTIONS_LOG = "ocr_corrections.log"
+NO_FUZZY_LEN = 3     # 不超过该长度的药名不做模糊匹配 (如 异丙嗪/氯丙嗪 只差一字却是不同的药)
+SHORT_NAME_LEN = 6   # 不超过该长度的药名只允许 1 处编辑差异，更长的允许 2 处
+
+VERDICT_EXACT = "exact"
+VERDICT_NEAR = "near"   # 近似命中：只给出候选，是否纠正由调用方再次识别确认
+VERDICT_MISS = "miss"
+
+
+def edit_distance(a, b):
+    # Levenshtein 距离 (BK 树依赖精确距离剪枝，不能提前截断)
+    if len(a) < len(b): a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def max_distance(text):
+    if len(text) <= NO_FUZZY_LEN: return 0
+    return 1 if len(text) <= SHORT_NAME_LEN else 2
+
+
+class BKTree:
+    # 按编辑距离组织的 BK 树，模糊查询只需访问满足三角不等式的子树
+    def __init__(self, words=()):
+        self.root = None
+        self.size = 0
+        for w in words: self.add(w)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            d = edit_distance(word, node[0])
+            if d == 0: return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_dist):
+        # 返回 [(距离, 词)]，按距离升序
+        if self.root is None: return []
+        found, stack = [], [self.root]
+        while stack:
+            w, children = stack.pop()
+            d = edit_distance(word, w)
+            if d <= max_dist: found.append((d, w))
+            for k, child in children.items():
+                if d - max_dist <= k <= d + max_dist:
+                    stack.append(child)
+        return sorted(found)
+
+
+class OcrValidator:
+    def __init__(self, words, log_file=CORRECTIONS_LOG):
+        self.words = set(words)
+        self.tree = BKTree(sorted(self.words))
+        self.log_file = log_file
+
+    def __len__(self):
+        return len(self.words)
+
+    def validate(self, text):
+        # 精确命中直接通过；唯一的近似命中返回候选；其余判为未命中
+        # 互相包含的名称 (去甲肾上腺素/肾上腺素、左氧氟沙星/氧氟沙星) 是不同的药，不算错字
+        if not text or text == "Unknown": return text, VERDICT_MISS
+        if text in self.words: return text, VERDICT_EXACT
+        limit = max_distance(text)
+        if not limit: return text, VERDICT_MISS
+        matches = [(d, w) for d, w in self.tree.search(text, limit) if w not in text and text not in w]
+        if matches and (len(matches) == 1 or matches[0][0] < matches[1][0]):
+            return matches[0][1], VERDICT_NEAR
+        return text, VERDICT_MISS
+
+    def add(self, word):
+        if word and word not in self.words:
+            self.words.add(word)
+            self.tree.add(word)
+
+    def log_correction(self, card_y, raw, corrected):
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{card_y}\t{raw}\t{corrected}\n")
+
+
+def load_dictionary(catalog=None):
+    # 词典来源：卡片目录中人工确认的名称、可选的词典文件
+    # 结构数据的键不算：预填草稿覆盖所有卡片，未审核卡片的误识别名称会被当成精确命中
+    words = set()
+    if catalog is not None:
+        words.update(c["name"] for c in catalog.cards(status=STATUS_CONFIRMED))
+
+    if os.path.exists(DICTIONARY_FILE):
+        with open(DICTIONARY_FILE, 'r', encoding='utf-8') as f:
+            words.update(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return OcrValidator(words)
+
+
+if __name__ == "__main__":
+    # 用法: python ocr_validator.py 名称1 名称2 ...
+    catalog = CardCatalog()
+    validator = load_dictionary(catalog)
+    catalog.close()
+    print(f"词典共 {len(validator)} 个名称")
+    for text in sys.argv[1:]:
+        print(text, *validator.validate(text))
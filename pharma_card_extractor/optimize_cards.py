@@ -0,0 +1,107 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from card_compaction import compaction_mask, row_occupancy, take_rows
+
+INPUT_DIR = "final_cards"
+OUTPUT_DIR = "optimized_cards"
+REPORT_FILE = "optimized_cards_report.json"
+
+TARGET_WIDTH = 1200        # 缩放到的目标宽度，None 表示不缩放
+PALETTE_COLORS = 16        # 调色板颜色数，0 表示不量化 (页面基本只有黑、蓝、白及其过渡色)
+OUTPUT_FORMAT = "png"      # "png" 或 "webp" (无损)
+STRIP_BLANK_RUNS = True
+MAX_BLANK_RUN = 24         # 连续空白行超过该高度时压缩到该高度 (按输出尺寸)
+MIN_PSNR = 24.0            # 文字像素上与同尺寸参考图比较的最低峰值信噪比 (dB)，低于则判定量化损伤了文字
+INK_LEVEL = 224            # 灰度低于该值的像素视为文字/线条，只在这些像素上计算 PSNR
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+def psnr(reference, candidate):
+    # 同尺寸灰度 PSNR，只统计任一侧有墨迹的像素 (整图大部分是白底，全图平均会掩盖笔画损伤)
+    ref = np.asarray(reference.convert("L"), dtype=np.float32)
+    cand = np.asarray(candidate.convert("L"), dtype=np.float32)
+    ink = (ref < INK_LEVEL) | (cand < INK_LEVEL)
+    if not ink.any(): return float("inf")
+    mse = np.mean((ref[ink] - cand[ink]) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def encode(img, out_path):
+    if OUTPUT_FORMAT == "webp":
+        img.save(out_path, format="WEBP", lossless=True, method=6)
+    else:
+        img.save(out_path, format="PNG", optimize=True)
+
+
+def optimize_card(path, out_dir):
+    path, out_dir = Path(path), Path(out_dir)
+    out_path = out_dir / f"{path.stem}.{OUTPUT_FORMAT}"
+    before = path.stat().st_size
+    try:
+        with Image.open(path) as src:
+            original = src.convert("RGB")
+
+        # 缩放到 TARGET_WIDTH 是配置决定的输出分辨率，PSNR 只校验量化：与同尺寸、未量化的缩放图比较
+        # (放大回原尺寸与 300 DPI 原图比较时，插值误差集中在笔画边缘，正常的缩放也远低于阈值)
+        reference = original
+        if TARGET_WIDTH and original.width > TARGET_WIDTH:
+            size = (TARGET_WIDTH, round(original.height * TARGET_WIDTH / original.width))
+            reference = original.resize(size, Image.Resampling.LANCZOS)
+
+        # 不量化时只缩放；量化不达标时保留原图 (缩放后的全彩图往往比原图更大)
+        img, score = (original if PALETTE_COLORS else reference), float("inf")
+        if PALETTE_COLORS:
+            quantized = reference.quantize(colors=PALETTE_COLORS, method=Image.Quantize.MEDIANCUT,
+                                           dither=Image.Dither.NONE)
+            quantized_score = psnr(reference, quantized)
+            if quantized_score >= MIN_PSNR:
+                img, score = quantized, quantized_score
+
+        # 去掉的只是纯空白行，放在视觉校验之后
+        if STRIP_BLANK_RUNS:
+            occupied = row_occupancy(np.asarray(img.convert("L")))
+            img = take_rows(img, compaction_mask(occupied, max_run=MAX_BLANK_RUN))
+
+        encode(img, out_path)
+        after = out_path.stat().st_size
+        return {"name": path.name, "before": before, "after": after,
+                "psnr": round(score, 2) if np.isfinite(score) else None,
+                "size": list(img.size), "ok": True}
+    except Exception as e:
+        return {"name": path.name, "before": before, "after": before, "error": str(e), "ok": False}
+
+
+def main():
+    input_path, output_path = Path(INPUT_DIR), Path(OUTPUT_DIR)
+    if not input_path.exists(): return
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    files = sorted(input_path.glob("*.png"))
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = list(pool.map(optimize_card, files, [output_path] * len(files), chunksize=8))
+
+    for r in results:
+        if r["ok"]:
+            saved = 1 - r["after"] / r["before"] if r["before"] else 0
+            print(f"{r['name']}: {r['before'] / 1024:.0f}KB -> {r['after'] / 1024:.0f}KB "
+                  f"(-{saved:.0%}, PSNR {r['psnr'] or '∞'}dB)")
+        else:
+            print(f"处理失败 {r['name']}: {r['error']}")
+
+    total_before = sum(r["before"] for r in results)
+    total_after = sum(r["after"] for r in results)
+    with open(REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"total_before": total_before, "total_after": total_after, "cards": results},
+                  f, ensure_ascii=False, indent=2)
+    if total_before:
+        print(f"合计: {total_before / 2 ** 20:.1f}MB -> {total_after / 2 ** 20:.1f}MB "
+              f"(节省 {1 - total_after / total_before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import hashlib
+import http.client
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import step4_drug_recognition as step4
+import step5_preprocess_titles as step5
+import step6_generate_cards as step6
+import ocr_validator
+from card_catalog import CardCatalog, load_page_offsets, STATUS_PENDING, STATUS_UNKNOWN
+from card_render import PageRenderer
+
+HOST = "127.0.0.1"
+PORT = 8765
+OCR_CACHE_FILE = "ocr_cache.db"
+DETECT_CONTEXT_ROWS = 400  # 按页检测时上下多取的行数 (300 DPI)，保证边界处的留白判断完整
+
+
+class WarmState:
+    # 常驻内存的数据：行特征、高分辨率单页缓存、页偏移表、API 长连接、OCR 缓存和词典；文件更新后自动重新加载
+    def __init__(self):
+        self.loaded = {}
+        self.api_key = step6.load_api_key()
+        self.conn = None
+        self.ocr_cache = sqlite3.connect(OCR_CACHE_FILE)
+        self.ocr_cache.execute("CREATE TABLE IF NOT EXISTS ocr (hash TEXT PRIMARY KEY, text TEXT, name TEXT)")
+        self.catalog = CardCatalog()
+        self.validator, self.validator_version = None, None
+
+    def cached(self, name, path, loader):
+        mtime = os.path.getmtime(path)
+        entry = self.loaded.get(name)
+        if entry is None or entry[0] != mtime:
+            entry = (mtime, loader(path))
+            self.loaded[name] = entry
+        return entry[1]
+
+    def row_profile(self):
+        # 行特征和按位压缩的蓝色掩码，step3 重新拼接 (页偏移表更新) 后重新生成
+        return self.cached("row_profile", step4.TRICOLOR_PAGES_MANIFEST, lambda path: step4.analyze_tricolor())
+
+    def page_renderer(self):
+        # 高分辨率单页图像的渲染器，已解码的页常驻在其 LRU 中
+        return self.cached("page_renderer", step4.CLEAN_PAGES_MANIFEST,
+                           lambda path: PageRenderer(step4.CLEAN_PAGES_DIR, path))
+
+    def pages(self):
+        clean = self.cached("clean_pages", step4.CLEAN_PAGES_MANIFEST, load_page_offsets)
+        detect = clean
+        if os.path.exists(step4.TRICOLOR_PAGES_MANIFEST):
+            detect = self.cached("detect_pages", step4.TRICOLOR_PAGES_MANIFEST, load_page_offsets)
+        return detect, clean
+
+    def dictionary_version(self):
+        # 其他进程 (审核界面) 提交到卡片目录时 data_version 变化；词典文件看修改时间
+        data_version = self.catalog.conn.execute("PRAGMA data_version").fetchone()[0]
+        path = ocr_validator.DICTIONARY_FILE
+        return data_version, os.path.getmtime(path) if os.path.exists(path) else 0
+
+    def current_validator(self):
+        # 人工确认了新名称后重建词典
+        version = self.dictionary_version()
+        if version != self.validator_version:
+            self.validator = step6.load_dictionary(self.catalog)
+            self.validator_version = version
+        return self.validator
+
+    def recognize(self, title_path, y, force=False):
+        # 按标题图内容哈希缓存识别结果 (force 时跳过缓存重新识别)；连接失效时重连重试一次
+        digest = hashlib.sha1(Path(title_path).read_bytes()).hexdigest()
+        if not force:
+            row = self.ocr_cache.execute("SELECT text, name FROM ocr WHERE hash = ?", (digest,)).fetchone()
+            if row: return row
+
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPSConnection(step6.API_HOST, timeout=30)
+            try:
+                text, name = step6.recognize_title(self.api_key, title_path, y, self.current_validator(), self.conn)
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt: raise
+        if text is None or name == "Unknown": return text, name  # 接口报错或未能确定的结果不缓存
+        with self.ocr_cache:
+            self.ocr_cache.execute("INSERT OR REPLACE INTO ocr VALUES (?, ?, ?)", (digest, text, name))
+        return text, name
+
+
+def page_rows(pages, first, last):
+    # 页码范围在长图中的 [y0, y1)
+    selected = [(y, h) for y, page, h in pages if first <= page <= last]
+    if not selected: raise ValueError(f"页码 {first}-{last} 不在长图范围内")
+    return selected[0][0], selected[-1][0] + selected[-1][1]
+
+
+def job_detect(state, job, first_page, last_page):
+    # 重新检测指定页码范围的标题，替换 check_titles_dir / titles_preprocessed 中对应的文件
+    row_status, blue_bits, width = state.row_profile()
+    detect_pages, clean_pages = state.pages()
+    scale = step4.detection_scale(detect_pages, clean_pages)
+    y0, y1 = page_rows(detect_pages, first_page, last_page)
+    ctx = round(DETECT_CONTEXT_ROWS * scale)
+    lo, hi = max(0, y0 - ctx), min(len(row_status), y1 + ctx)
+
+    found = step4.step2_find_candidates(row_status[lo:hi], blue_bits[lo:hi], width, scale)
+    candidates = [(s + lo, e + lo) for s, e in found if y0 <= s + lo < y1]
+    if scale != 1.0:
+        candidates = [(step4.map_to_clean(s, detect_pages, clean_pages), step4.map_to_clean(e, detect_pages, clean_pages))
+                      for s, e in candidates]
+
+    cy0, cy1 = page_rows(clean_pages, first_page, last_page)
+    for d in (step4.OUTPUT_CHECK_DIR, step5.OUTPUT_DIR):
+        for f in Path(d).glob("*.png"):
+            if f.stem.isdigit() and cy0 <= int(f.stem) < cy1: f.unlink()
+
+    job["total"] = len(candidates)
+    step4.step3_crop_and_save(candidates, state.page_renderer())
+    out_path = Path(step5.OUTPUT_DIR)
+    out_path.mkdir(parents=True, exist_ok=True)
+    for start_y, _ in candidates:
+        step5.process_single_image(Path(step4.OUTPUT_CHECK_DIR) / f"{start_y}.png", out_path)
+        job["progress"] += 1
+    job["result"] = [s for s, _ in candidates]
+
+
+def job_ocr(state, job, cards, force=True):
+    # 重新识别指定卡片 (卡片 ID 列表) 的标题并改名；默认不使用缓存，确保重新调用接口
+    job["total"] = len(cards)
+    renamed = {}
+    for card_id in cards:
+        card = state.catalog.get(card_id)
+        if card is None: raise ValueError(f"卡片 {card_id} 不存在")
+        title_path = Path(step6.TITLES_DIR) / f"{card['y_start']}.png"
+        _, name = state.recognize(title_path, card["y_start"], force)
+        status = STATUS_UNKNOWN if name == "Unknown" else STATUS_PENDING
+        state.catalog.rename(card_id, name, status=status)
+        renamed[card_id] = name
+        job["progress"] += 1
+    job["result"] = renamed
+
+
+JOB_TYPES = {
+    "detect": lambda state, job, p: job_detect(state, job, int(p["first_page"]), int(p["last_page"])),
+    "ocr": lambda state, job, p: job_ocr(state, job, [int(c) for c in p["cards"]], bool(p.get("force", True))),
+}
+
+
+class JobQueue:
+    # 单工作线程顺序执行任务，常驻数据只在该线程中使用
+    def __init__(self):
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.worker, daemon=True).start()
+
+    def submit(self, params):
+        if params.get("type") not in JOB_TYPES:
+            raise ValueError(f"未知任务类型: {params.get('type')}，可选: {', '.join(JOB_TYPES)}")
+        job = {"id": next(self.ids), "type": params["type"], "params": params, "status": "queued",
+               "progress": 0, "total": None, "result": None, "error": None,
+               "created": time.time(), "finished": None}
+        with self.lock:
+            self.jobs[job["id"]] = job
+        self.queue.put(job)
+        return job
+
+    def worker(self):
+        state = WarmState()
+        while True:
+            job = self.queue.get()
+            job["status"] = "running"
+            try:
+                JOB_TYPES[job["type"]](state, job, job["params"])
+                job["status"] = "done"
+            except Exception as e:
+                traceback.print_exc()
+                job["status"], job["error"] = "failed", str(e)
+            job["finished"] = time.time()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # POST /jobs 提交任务，GET /jobs 或 /jobs/<id> 查询进度
+    jobs = None
+
+    def send_json(self, code, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["jobs"]:
+            with self.jobs.lock:
+                self.send_json(200, list(self.jobs.jobs.values()))
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit() and int(parts[1]) in self.jobs.jobs:
+            self.send_json(200, self.jobs.jobs[int(parts[1])])
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = self.jobs.submit(json.loads(self.rfile.read(length) or b"{}"))
+            self.send_json(202, job)
+        except (ValueError, json.JSONDecodeError) as e:
+            self.send_json(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=HOST, port=PORT):
+    ServiceHandler.jobs = JobQueue()
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"流水线服务已启动: http://{host}:{port}/jobs")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,36 +1,51 @@
 import os
 from pdf2image import convert_from_path
 from pathlib import Path
+from step3_concat_images import START_PAGE_INDEX, END_PAGE_INDEX
 
 PDF_PATH = r"药理学.pdf"
 OUTPUT_DIR = "raw_pages_dir"
 DPI = 300
+# 双分辨率模式 (可选)：低 DPI 副本只用于标题检测，高 DPI 只渲染正文页范围用于裁剪卡片
+TWO_RESOLUTION = False  # 默认关闭；开启前需确认与 300 DPI 检测结果一致
+DETECT_OUTPUT_DIR = "raw_pages_detect_dir"
+DETECT_DPI = 100
 CURRENT_DIR = os.getcwd()
 POPPLER_PATH = os.path.join(CURRENT_DIR, "poppler-25.12.0", "Library", "bin")
 
-def split_pdf():
-    output_path = Path(OUTPUT_DIR)
+def render_pages(output_dir, dpi, first_page=None, last_page=None):
+    output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    try:
-        # 将PDF页面转换为PNG图像
-        convert_from_path(
-            PDF_PATH,
-            dpi=DPI,
-            output_folder=OUTPUT_DIR,
-            fmt='png',
-            output_file='page',
-            poppler_path=POPPLER_PATH,
-            paths_only=True
-        )
+    # 将PDF页面转换为PNG图像
+    convert_from_path(
+        PDF_PATH,
+        dpi=dpi,
+        output_folder=output_dir,
+        fmt='png',
+        output_file='page',
+        poppler_path=POPPLER_PATH,
+        paths_only=True,
+        first_page=first_page,
+        last_page=last_page
+    )
+
+    # 统一重命名为数字序列 (与PDF页码一致)
+    files = sorted(list(output_path.glob("page*.png")))
+    offset = first_page or 1
+    for i, file_path in enumerate(files):
+        new_name = output_path / f"{i + offset}.png"
+        if new_name.exists() and new_name != file_path:
+            os.remove(new_name)
+        os.rename(file_path, new_name)
 
-        # 统一重命名为数字序列
-        files = sorted(list(output_path.glob("*.png")))
-        for i, file_path in enumerate(files):
-            new_name = output_path / f"{i + 1}.png"
-            if new_name.exists() and new_name != file_path:
-                os.remove(new_name)
-            os.rename(file_path, new_name)
+def split_pdf():
+    try:
+        if TWO_RESOLUTION:
+            render_pages(DETECT_OUTPUT_DIR, DETECT_DPI)
+            render_pages(OUTPUT_DIR, DPI, START_PAGE_INDEX, END_PAGE_INDEX)
+        else:
+            render_pages(OUTPUT_DIR, DPI)
 
     except Exception as e:
         print(f"错误: {e}")
@@ -2,6 +2,7 @@ import os
 import numpy as np
 from PIL import Image
 from pathlib import Path
+from step1_split_pdf import DPI, DETECT_DPI, DETECT_OUTPUT_DIR, TWO_RESOLUTION
 
 INPUT_DIR = "raw_pages_dir"
 OUTPUT_DIR_CLEAN = "cropped_pages_clean"
@@ -44,13 +45,14 @@ def process_tricolor(img):
 
     return Image.fromarray(result)
 
-def main():
-    input_path = Path(INPUT_DIR)
-    out_path_clean = Path(OUTPUT_DIR_CLEAN)
-    out_path_tricolor = Path(OUTPUT_DIR_TRICOLOR)
+def scale_box(box, scale):
+    # 裁剪区域按 DPI 比例换算
+    return tuple(round(v * scale) for v in box)
 
-    out_path_clean.mkdir(parents=True, exist_ok=True)
-    out_path_tricolor.mkdir(parents=True, exist_ok=True)
+def process_pages(input_dir, scale=1.0, out_clean=None, out_tricolor=None):
+    input_path = Path(input_dir)
+    for out_path in (out_clean, out_tricolor):
+        if out_path: Path(out_path).mkdir(parents=True, exist_ok=True)
 
     files = sorted(input_path.glob("*.png"), key=lambda x: int(x.stem))
 
@@ -60,13 +62,23 @@ def main():
             with Image.open(file_path) as img:
                 # 区分奇偶页裁剪
                 crop_box = ODD_PAGE_CROP_BOX if page_num % 2 != 0 else EVEN_PAGE_CROP_BOX
-                cropped_img = img.crop(crop_box)
+                cropped_img = img.crop(scale_box(crop_box, scale))
 
-                process_clean_background(cropped_img.copy()).save(out_path_clean / f"{page_num}.png")
-                process_tricolor(cropped_img).save(out_path_tricolor / f"{page_num}.png")
+                if out_clean:
+                    process_clean_background(cropped_img.copy()).save(Path(out_clean) / f"{page_num}.png")
+                if out_tricolor:
+                    process_tricolor(cropped_img).save(Path(out_tricolor) / f"{page_num}.png")
 
         except Exception as e:
             print(f"Error 第 {page_num} 页: {e}")
 
+def main():
+    if TWO_RESOLUTION:
+        # 高分辨率只生成用于出卡的干净页，三值化检测页来自低 DPI 副本
+        process_pages(INPUT_DIR, out_clean=OUTPUT_DIR_CLEAN)
+        process_pages(DETECT_OUTPUT_DIR, DETECT_DPI / DPI, out_tricolor=OUTPUT_DIR_TRICOLOR)
+    else:
+        process_pages(INPUT_DIR, out_clean=OUTPUT_DIR_CLEAN, out_tricolor=OUTPUT_DIR_TRICOLOR)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
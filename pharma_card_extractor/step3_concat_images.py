@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 from PIL import Image
 
@@ -8,6 +9,8 @@ DIR_CLEAN = "cropped_pages_clean"
 DIR_TRICOLOR = "cropped_pages_tricolor"
 OUT_FILENAME_CLEAN = "long_image_clean.png"
 OUT_FILENAME_TRICOLOR = "long_image_tricolor.png"
+OUT_PAGES_MANIFEST = "long_image_pages.json"
+OUT_TRICOLOR_PAGES_MANIFEST = "long_image_tricolor_pages.json"
 
 Image.MAX_IMAGE_PIXELS = None
 
@@ -20,7 +23,16 @@ def get_image_files(input_dir, start_idx, end_idx):
             image_files.append(file_path)
     return image_files
 
-def create_long_image(input_dir_name, output_filename):
+def write_page_manifest(files, heights, manifest_filename):
+    # 记录每页在长图中的起始 y 坐标，供后续步骤换算页码
+    pages, current_y = [], 0
+    for file_path, height in zip(files, heights):
+        pages.append({"page": int(file_path.stem), "y": current_y, "height": height})
+        current_y += height
+    with open(manifest_filename, 'w', encoding='utf-8') as f:
+        json.dump(pages, f, indent=2)
+
+def create_long_image(input_dir_name, output_filename, manifest_filename=None):
     files = get_image_files(input_dir_name, START_PAGE_INDEX, END_PAGE_INDEX)
     if not files: return
 
@@ -44,13 +56,16 @@ def create_long_image(input_dir_name, output_filename):
                 current_y += img.height
 
         canvas.save(output_filename, format="PNG", optimize=False)
+        if manifest_filename:
+            write_page_manifest(files, heights, manifest_filename)
 
     except Exception as e:
         print(f"错误: {e}")
 
 def main():
-    create_long_image(DIR_CLEAN, OUT_FILENAME_CLEAN)
-    create_long_image(DIR_TRICOLOR, OUT_FILENAME_TRICOLOR)
+    create_long_image(DIR_CLEAN, OUT_FILENAME_CLEAN, OUT_PAGES_MANIFEST)
+    # 双分辨率模式下三值化长图分辨率不同，step4 依据两份页偏移表换算坐标
+    create_long_image(DIR_TRICOLOR, OUT_FILENAME_TRICOLOR, OUT_TRICOLOR_PAGES_MANIFEST)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,16 +1,24 @@
 import os
+import bisect
+import math
 import numpy as np
 from PIL import Image
 from pathlib import Path
 import gc
+from card_catalog import load_page_offsets
+from card_render import PageRenderer
 
-TRICOLOR_IMAGE_PATH = "long_image_tricolor.png"
-CLEAN_IMAGE_PATH = "long_image_clean.png"
+CLEAN_PAGES_DIR = "cropped_pages_clean"
 OUTPUT_CHECK_DIR = "check_titles_dir"
+CLEAN_PAGES_MANIFEST = "long_image_pages.json"
+TRICOLOR_PAGES_MANIFEST = "long_image_tricolor_pages.json"
+TRICOLOR_PAGES_DIR = "cropped_pages_tricolor"
+CHUNK_ROWS = 512  # 逐块计算掩码，每块只占用 CHUNK_ROWS 行的临时内存
 
 COLOR_BLUE = np.array([0, 172, 239])
 COLOR_WHITE = np.array([255, 255, 255])
 
+# 以下阈值均按 300 DPI 标定，检测图分辨率不同时按比例换算
 # 垂直形态特征
 MIN_TOP_WHITE_H = 10
 MIN_BLUE_REGION_H = 38
@@ -27,34 +35,104 @@ CENTER_RIGHT_LIMIT = 901
 Image.MAX_IMAGE_PIXELS = None
 
 
-def calculate_max_continuous(bool_arr):
-    # 计算最长连续True序列长度
-    if not np.any(bool_arr): return 0
-    padded = np.concatenate(([False], bool_arr, [False]))
-    diff = np.diff(padded.astype(int))
-    starts = np.where(diff == 1)[0]
-    ends = np.where(diff == -1)[0]
-    return (ends - starts).max() if len(starts) > 0 else 0
+def row_extent(bits_row):
+    # 位图行中第一个和最后一个置位像素的 x 坐标 (packbits 为高位在前)，无置位时返回 None
+    nz = np.flatnonzero(bits_row)
+    if len(nz) == 0: return None
+    first, last = int(bits_row[nz[0]]), int(bits_row[nz[-1]])
+    return nz[0] * 8 + 8 - first.bit_length(), nz[-1] * 8 + 8 - (last & -last).bit_length()
 
 
-def step1_analyze_structure(image_array):
-    # 分析行特征：0为纯白，1为含蓝，2为含杂色
-    is_white = np.all(image_array == COLOR_WHITE, axis=2)
-    is_blue = np.all(image_array == COLOR_BLUE, axis=2)
-    row_has_other = np.any(~(is_white | is_blue), axis=1)
-    row_has_blue = np.any(is_blue, axis=1)
+def longest_run(bits_row, limit=None):
+    # 最长连续置位长度：每次 v &= v << 1 使所有连续段缩短 1，迭代次数即最长段；达到 limit 即可停止
+    v = int.from_bytes(bits_row.tobytes(), 'big')
+    run = 0
+    while v and (limit is None or run < limit):
+        v &= v << 1
+        run += 1
+    return run
+
+
+def analyze_rows(chunks):
+    # 分块分析行特征：0为纯白，1为含蓝，2为含杂色；蓝色掩码按位压缩保存 (每像素 1 bit)
+    statuses, blue_bits, width = [], [], 0
+    for chunk in chunks:
+        is_white = np.all(chunk == COLOR_WHITE, axis=2)
+        is_blue = np.all(chunk == COLOR_BLUE, axis=2)
+        row_has_other = ~np.all(is_white | is_blue, axis=1)
+        row_has_blue = np.any(is_blue, axis=1)
 
-    row_status = np.zeros(image_array.shape[0], dtype=np.int8)
-    row_status[row_has_other] = 2
-    row_status[row_has_blue & ~row_has_other] = 1
-    return row_status, is_blue, image_array.shape[1]
+        row_status = np.zeros(chunk.shape[0], dtype=np.int8)
+        row_status[row_has_other] = 2
+        row_status[row_has_blue & ~row_has_other] = 1
+        statuses.append(row_status)
+        blue_bits.append(np.packbits(is_blue, axis=1))
+        width = chunk.shape[1]
+    if not statuses: return np.zeros(0, dtype=np.int8), np.zeros((0, 0), dtype=np.uint8), 0
+    return np.concatenate(statuses), np.concatenate(blue_bits), width
 
 
-def step2_find_candidates(row_status, is_blue_matrix, img_width):
-    # 扫描符合标题波形特征的区域
+def step1_analyze_structure(image_array):
+    return analyze_rows(image_array[y:y + CHUNK_ROWS] for y in range(0, image_array.shape[0], CHUNK_ROWS))
+
+
+def iter_page_chunks(pages, pages_dir, width):
+    # 逐页解码三值化单页图像，右侧按 step3 的拼接方式补白到长图宽度
+    for _, page, _ in pages:
+        with Image.open(Path(pages_dir) / f"{page}.png") as img:
+            arr = np.asarray(img.convert('RGB'))
+        if arr.shape[1] < width:
+            arr = np.pad(arr, ((0, 0), (0, width - arr.shape[1]), (0, 0)), constant_values=255)
+        for y in range(0, arr.shape[0], CHUNK_ROWS):
+            yield arr[y:y + CHUNK_ROWS]
+
+
+def analyze_tricolor():
+    # 逐页读取三值化单页图像，不解码整张长图
+    pages = load_page_offsets(TRICOLOR_PAGES_MANIFEST)
+    paths = [Path(TRICOLOR_PAGES_DIR) / f"{page}.png" for _, page, _ in pages]
+    if not paths or not all(p.exists() for p in paths):
+        raise FileNotFoundError(f"缺少 {TRICOLOR_PAGES_DIR} 单页图像或页偏移表 {TRICOLOR_PAGES_MANIFEST}")
+    widths = []
+    for p in paths:
+        with Image.open(p) as img: widths.append(img.width)
+    return analyze_rows(iter_page_chunks(pages, TRICOLOR_PAGES_DIR, max(widths)))
+
+
+def scaled(value, scale, round_up=False):
+    # 下限类阈值向下取整、上限类阈值向上取整，低分辨率时不漏检
+    v = value * scale
+    return max(1, math.ceil(v) if round_up else math.floor(v))
+
+
+def detection_scale(detect_pages, clean_pages):
+    # 检测图与出卡图的分辨率之比，取自两份页偏移表
+    if not detect_pages or not clean_pages: return 1.0
+    clean_heights = {page: h for _, page, h in clean_pages}
+    ratios = [h / clean_heights[page] for _, page, h in detect_pages if clean_heights.get(page)]
+    return float(np.median(ratios)) if ratios else 1.0
+
+
+def map_to_clean(y, detect_pages, clean_pages):
+    # 按页换算：检测图中的页内相对位置映射到高分辨率长图，避免累积取整误差
+    if not detect_pages or not clean_pages: return y
+    i = max(0, bisect.bisect_right([p[0] for p in detect_pages], y) - 1)
+    page_y, page, page_h = detect_pages[i]
+    clean = {p: (cy, ch) for cy, p, ch in clean_pages}.get(page)
+    if clean is None: return y
+    return clean[0] + round((y - page_y) * clean[1] / page_h)
+
+
+def step2_find_candidates(row_status, blue_bits, img_width, scale=1.0):
+    # 扫描符合标题波形特征的区域；blue_bits 为按位压缩的蓝色掩码
     candidates = []
     h = len(row_status)
-    edge_right_limit = img_width - EDGE_MARGIN
+    min_top_white, min_bottom_white = scaled(MIN_TOP_WHITE_H, scale), scaled(MIN_BOTTOM_WHITE_H, scale)
+    min_blue_h, max_blue_h = scaled(MIN_BLUE_REGION_H, scale), scaled(MAX_BLUE_REGION_H, scale, True)
+    min_width, max_cont_blue = scaled(MIN_WIDTH_THRESHOLD, scale), scaled(MAX_CONT_BLUE_PIXELS, scale, True)
+    edge_margin = scaled(EDGE_MARGIN, scale)
+    center_left, center_right = scaled(CENTER_LEFT_LIMIT, scale), scaled(CENTER_RIGHT_LIMIT, scale, True)
+    edge_right_limit = img_width - edge_margin
     i = 0
     while i < h:
         if row_status[i] != 1:
@@ -67,7 +145,7 @@ def step2_find_candidates(row_status, is_blue_matrix, img_width):
         while p >= 0 and row_status[p] == 0:
             top_white_count += 1
             p -= 1
-        if top_white_count <= MIN_TOP_WHITE_H:
+        if top_white_count <= min_top_white:
             while i < h and row_status[i] == 1: i += 1
             continue
 
@@ -76,7 +154,7 @@ def step2_find_candidates(row_status, is_blue_matrix, img_width):
         while i < h and row_status[i] == 1: i += 1
         blue_end = i
         blue_height = blue_end - blue_start
-        if not (MIN_BLUE_REGION_H <= blue_height <= MAX_BLUE_REGION_H): continue
+        if not (min_blue_h <= blue_height <= max_blue_h): continue
 
         # 检查下方留白高度
         bottom_white_count = 0
@@ -84,58 +162,63 @@ def step2_find_candidates(row_status, is_blue_matrix, img_width):
         while p < h and row_status[p] == 0:
             bottom_white_count += 1
             p += 1
-        if bottom_white_count <= MIN_BOTTOM_WHITE_H: continue
+        if bottom_white_count <= min_bottom_white: continue
 
         # 像素级校验：排除长横条、检查宽度及边缘距离
         valid_candidate = True
         all_min_x, all_max_x = [], []
         max_width_diff = 0
         for r in range(blue_start, blue_end):
-            row_bool = is_blue_matrix[r]
-            indices = np.where(row_bool)[0]
-            if len(indices) == 0: continue
-            x_l, x_r = indices[0], indices[-1]
+            extent = row_extent(blue_bits[r])
+            if extent is None: continue
+            x_l, x_r = extent
             all_min_x.append(x_l)
             all_max_x.append(x_r)
             max_width_diff = max(max_width_diff, x_r - x_l)
-            if calculate_max_continuous(row_bool) >= MAX_CONT_BLUE_PIXELS:
+            if longest_run(blue_bits[r], max_cont_blue) >= max_cont_blue:
                 valid_candidate = False;
                 break
 
-        if not valid_candidate or not all_min_x or max_width_diff <= MIN_WIDTH_THRESHOLD: continue
+        if not valid_candidate or not all_min_x or max_width_diff <= min_width: continue
 
         block_min_x, block_max_x = min(all_min_x), max(all_max_x)
-        if block_min_x <= EDGE_MARGIN or block_max_x >= edge_right_limit: continue
-        if block_max_x <= CENTER_LEFT_LIMIT or block_min_x >= CENTER_RIGHT_LIMIT: continue
+        if block_min_x <= edge_margin or block_max_x >= edge_right_limit: continue
+        if block_max_x <= center_left or block_min_x >= center_right: continue
 
         candidates.append((blue_start - top_white_count, blue_end + bottom_white_count))
     return candidates
 
 
-def step3_crop_and_save(candidates):
-    # 根据识别到的坐标从原图裁剪
+def step3_crop_and_save(candidates, renderer=None):
+    # 根据识别到的坐标从高分辨率单页图像裁剪 (只解码涉及的页)；renderer 可传入常驻的 PageRenderer
     if not candidates: return
     try:
-        img = Image.open(CLEAN_IMAGE_PATH)
-        img.load()
+        if renderer is None:
+            renderer = PageRenderer(CLEAN_PAGES_DIR, CLEAN_PAGES_MANIFEST)
         out_path = Path(OUTPUT_CHECK_DIR)
         out_path.mkdir(parents=True, exist_ok=True)
         for start_y, end_y in candidates:
-            img.crop((0, start_y, img.width, end_y)).save(out_path / f"{start_y}.png")
+            renderer.render_range(start_y, end_y).save(out_path / f"{start_y}.png")
     except Exception as e:
         print(f"裁剪出错: {e}")
 
 
 def main():
-    if not os.path.exists(TRICOLOR_IMAGE_PATH): return
-    with Image.open(TRICOLOR_IMAGE_PATH) as img:
-        tricolor_arr = np.array(img.convert('RGB'))
+    if not os.path.exists(TRICOLOR_PAGES_MANIFEST) or not os.path.exists(CLEAN_PAGES_MANIFEST): return
+
+    # 双分辨率模式：在低 DPI 长图上检测，再把坐标映射回高分辨率长图裁剪
+    detect_pages = load_page_offsets(TRICOLOR_PAGES_MANIFEST)
+    clean_pages = load_page_offsets(CLEAN_PAGES_MANIFEST)
+    scale = detection_scale(detect_pages, clean_pages)
 
-    row_status, is_blue_matrix, width = step1_analyze_structure(tricolor_arr)
-    candidates = step2_find_candidates(row_status, is_blue_matrix, width)
+    row_status, blue_bits, width = analyze_tricolor()
+    candidates = step2_find_candidates(row_status, blue_bits, width, scale)
 
-    del tricolor_arr, row_status, is_blue_matrix
+    del row_status, blue_bits
     gc.collect()
+    if scale != 1.0:
+        candidates = [(map_to_clean(s, detect_pages, clean_pages), map_to_clean(e, detect_pages, clean_pages))
+                      for s, e in candidates]
     step3_crop_and_save(candidates)
 
 
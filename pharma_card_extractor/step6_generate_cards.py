@@ -5,6 +5,8 @@ import http.client
 import re
 from pathlib import Path
 from PIL import Image
+from card_catalog import CardCatalog, STATUS_CONFIRMED, STATUS_PENDING, STATUS_UNKNOWN, card_filename
+from ocr_validator import load_dictionary, VERDICT_EXACT, VERDICT_NEAR
 
 TITLES_DIR = "titles_preprocessed"
 CLEAN_IMAGE_PATH = "long_image_clean.png"
@@ -12,6 +14,8 @@ OUTPUT_CARDS_DIR = "final_cards"
 API_HOST = "api2.aigcbest.top"
 API_ENDPOINT = "/v1/responses"
 MODEL_NAME = "gpt-5-mini"
+REQUERY_ON_MISS = True  # 词典未命中时重新识别一次，两次结果一致才采用
+LAZY_CARDS = False      # 只在卡片目录中记录坐标，不写出卡片 PNG；界面和导出时由 card_render 按需生成
 
 Image.MAX_IMAGE_PIXELS = None
 
@@ -28,8 +32,8 @@ def load_api_key():
     return os.environ.get("API_KEY")
 
 
-def call_multimodal_api(api_key, image_path):
-    # 调用多模态API识别药品名称
+def call_multimodal_api(api_key, image_path, conn=None):
+    # 调用多模态API识别药品名称；传入 conn 时复用长连接，由调用方负责关闭
     with open(image_path, "rb") as f:
         base64_image = base64.b64encode(f.read()).decode('utf-8')
 
@@ -43,11 +47,14 @@ def call_multimodal_api(api_key, image_path):
         "max_output_tokens": 4096
     })
 
-    conn = http.client.HTTPSConnection(API_HOST, timeout=30)
+    own_conn = conn is None
+    if own_conn:
+        conn = http.client.HTTPSConnection(API_HOST, timeout=30)
     conn.request("POST", API_ENDPOINT, payload, headers)
     res = conn.getresponse()
     data = res.read().decode("utf-8")
-    conn.close()
+    if own_conn:
+        conn.close()
 
     response_json = json.loads(data)
     if res.status == 200:
@@ -67,21 +74,59 @@ def sanitize_filename(text):
     return text.replace('\n', '').replace('\r', '').strip()[:50]
 
 
+def recognize_title(api_key, title_img_path, current_y, validator, conn=None):
+    # 识别并用词典校验：精确命中通过；近似命中或未命中时重新识别，
+    # 两次结果一致则采用，两次都指向同一近似词条才纠正，否则交给人工
+    ocr_text, _ = call_multimodal_api(api_key, title_img_path, conn)
+    raw_name = sanitize_filename(ocr_text or "Unknown")
+    if not len(validator) or raw_name == "Unknown": return ocr_text, raw_name
+
+    name, verdict = validator.validate(raw_name)
+    if verdict == VERDICT_EXACT or not REQUERY_ON_MISS: return ocr_text, raw_name
+
+    retry_text, _ = call_multimodal_api(api_key, title_img_path, conn)
+    retry_name = sanitize_filename(retry_text or "Unknown")
+    retry, retry_verdict = validator.validate(retry_name)
+    if retry_verdict == VERDICT_EXACT:
+        validator.log_correction(current_y, raw_name, retry)
+        return retry_text, retry
+    if retry_name == raw_name:
+        # 两次一致：采用识别结果，不做纠正；未经人工确认，不加入词典
+        return ocr_text, raw_name
+    if verdict == VERDICT_NEAR and retry_verdict == VERDICT_NEAR and retry == name:
+        validator.log_correction(current_y, raw_name, name)
+        return ocr_text, name
+    return ocr_text, "Unknown"
+
+
 def main():
     api_key = load_api_key()
     titles_path = Path(TITLES_DIR)
-    output_path = Path(OUTPUT_CARDS_DIR)
-    output_path.mkdir(parents=True, exist_ok=True)
+    Path(OUTPUT_CARDS_DIR).mkdir(parents=True, exist_ok=True)
 
     files = sorted([(int(f.stem), f) for f in titles_path.glob("*.png") if f.stem.isdigit()], key=lambda x: x[0])
+    if not files: return
     big_img = Image.open(CLEAN_IMAGE_PATH)
+    catalog = CardCatalog(cards_dir=OUTPUT_CARDS_DIR)
+    validator = load_dictionary(catalog)
 
     for i, (current_y, title_img_path) in enumerate(files):
         crop_end_y = files[i + 1][0] if i < len(files) - 1 else big_img.height
-        ocr_text, _ = call_multimodal_api(api_key, title_img_path)
-
-        safe_name = sanitize_filename(ocr_text or "Unknown")
-        big_img.crop((0, current_y, big_img.width, crop_end_y)).save(output_path / f"{safe_name}_{current_y}.png")
+        existing = catalog.get_by_y(current_y)
+        if existing is not None and existing["status"] == STATUS_CONFIRMED:
+            # 已人工确认的卡片不再调用接口，只更新边界
+            ocr_text, safe_name = existing["ocr_text"], existing["name"]
+        else:
+            ocr_text, safe_name = recognize_title(api_key, title_img_path, current_y, validator)
+        filename = None if LAZY_CARDS else card_filename(safe_name, current_y)
+        status = STATUS_UNKNOWN if safe_name == "Unknown" else STATUS_PENDING
+        card_id = catalog.upsert_card(current_y, crop_end_y, safe_name, ocr_text=ocr_text, status=status, filename=filename)
+        if filename:
+            big_img.crop((0, current_y, big_img.width, crop_end_y)).save(catalog.path(catalog.get(card_id)))
+
+    removed = catalog.prune(y for y, _ in files)
+    if removed: print(f"已移除 {removed} 张不再检测到的卡片")
+    catalog.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import unicodedata
+from structure_store import iter_structure_data
+
+INDEX_FILE = "structure_index.db"
+STORE_FILE = "structure_data.db"
+LEGACY_JSON_FILE = "structure_data.json"
+NGRAM = 2          # 字符 n 元组长度；短于该长度的查询词走单字倒排
+MAX_RESULTS = 200
+
+FIELD_DRUG = "drug"
+FIELD_SECTION = "section"
+FIELD_ITEM = "item"
+
+
+def normalize(text):
+    # 全角/半角统一、英文小写，索引和查询使用同一规则
+    return unicodedata.normalize("NFKC", text or "").lower().strip()
+
+
+def grams(text, n=NGRAM):
+    # 单字和 n 元组都建倒排，单字查询也能命中
+    result = set(text)
+    result.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return result
+
+
+def query_grams(text, n=NGRAM):
+    if len(text) < n: return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def drug_name(key):
+    return key.rsplit('_', 1)[0] if '_' in key else key
+
+
+def entries_for(key, sections):
+    # 一张卡片展开为 (字段, 章节标题, 序号, 文本)：药名、各章节标题、各条目
+    drug = drug_name(key)
+    yield FIELD_DRUG, None, 0, drug
+    for section in sections or []:
+        title = section.get('title', '')
+        if title: yield FIELD_SECTION, title, 0, title
+        for index, item in enumerate(section.get('items', []), 1):
+            yield FIELD_ITEM, title, index, item
+
+
+def content_hash(sections):
+    return hashlib.sha1(json.dumps(sections, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class StructureIndex:
+    # 结构数据的倒排索引：字符 n 元组 -> 条目；按卡片内容哈希增量更新
+    def __init__(self, path=INDEX_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                key TEXT PRIMARY KEY,
+                hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                drug TEXT NOT NULL,
+                field TEXT NOT NULL,
+                section TEXT,
+                section_norm TEXT,
+                pos INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                norm TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_key ON entries (key);
+            CREATE INDEX IF NOT EXISTS idx_entries_prefix ON entries (norm);
+            CREATE INDEX IF NOT EXISTS idx_entries_section ON entries (section_norm);
+            CREATE TABLE IF NOT EXISTS postings (
+                gram TEXT NOT NULL,
+                entry INTEGER NOT NULL,
+                PRIMARY KEY (gram, entry)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _remove(self, key):
+        rows = self.conn.execute("SELECT id, norm FROM entries WHERE key = ?", (key,)).fetchall()
+        self.conn.executemany("DELETE FROM postings WHERE gram = ? AND entry = ?",
+                              ((g, i) for i, norm in rows for g in grams(norm)))
+        self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.conn.execute("DELETE FROM docs WHERE key = ?", (key,))
+
+    def _add(self, key, sections):
+        drug = drug_name(key)
+        for field, section, pos, text in entries_for(key, sections):
+            norm = normalize(text)
+            if not norm: continue
+            cur = self.conn.execute(
+                "INSERT INTO entries (key, drug, field, section, section_norm, pos, text, norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, drug, field, section, normalize(section) if section else None, pos, text, norm))
+            self.conn.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                                  ((g, cur.lastrowid) for g in grams(norm)))
+        self.conn.execute("INSERT OR REPLACE INTO docs VALUES (?, ?)", (key, content_hash(sections)))
+
+    def update_many(self, pairs):
+        # 只重建内容变化的卡片，单事务提交；返回实际更新的数量
+        known = dict(self.conn.execute("SELECT key, hash FROM docs"))
+        changed = 0
+        with self.conn:
+            for key, sections in pairs:
+                if known.get(key) == content_hash(sections): continue
+                if key in known: self._remove(key)
+                self._add(key, sections)
+                changed += 1
+        return changed
+
+    def remove_many(self, keys):
+        with self.conn:
+            for key in keys:
+                self._remove(key)
+
+    def sync(self, source):
+        # 与结构数据同步：新增/修改的卡片重建，已删除或改名的旧键移除
+        seen = set()
+
+        def pairs():
+            for key, sections in iter_structure_data(source):
+                seen.add(key)
+                yield key, sections
+
+        changed = self.update_many(pairs())
+        stale = [k for (k,) in self.conn.execute("SELECT key FROM docs") if k not in seen]
+        self.remove_many(stale)
+        return changed, len(stale)
+
+    def search(self, text, field=None, section=None, prefix=False, limit=MAX_RESULTS):
+        # 子串查询 (默认) 或前缀查询；section 限定章节标题 (子串匹配)；返回按卡片顺序排列的命中条目
+        norm = normalize(text)
+        if not norm: return []
+        where, params = [], []
+        if prefix:
+            # 前缀查询直接走 norm 有序索引的范围扫描
+            where.append("e.norm >= ? AND e.norm < ?")
+            params += [norm, norm + "\U0010ffff"]
+            source = "entries e"
+        else:
+            qgrams = sorted(query_grams(norm))
+            source = f"""(SELECT entry FROM postings WHERE gram IN ({','.join('?' * len(qgrams))})
+                          GROUP BY entry HAVING COUNT(*) = ?) p JOIN entries e ON e.id = p.entry"""
+            params += qgrams + [len(qgrams)]
+            where.append("instr(e.norm, ?) > 0")
+            params.append(norm)
+        if field:
+            where.append("e.field = ?")
+            params.append(field)
+        if section:
+            where.append("instr(e.section_norm, ?) > 0")
+            params.append(normalize(section))
+        sql = f"""SELECT e.key, e.drug, e.field, e.section, e.pos, e.text FROM {source}
+                  WHERE {' AND '.join(where)} ORDER BY e.id LIMIT ?"""
+        rows = self.conn.execute(sql, params + [limit])
+        return [dict(zip(("key", "drug", "field", "section", "pos", "text"), r)) for r in rows]
+
+    def drugs(self, text, section=None, **kwargs):
+        # 条目中出现 text 的药品 (去重，保持顺序)，如 drugs("抗心律失常", section="临床应用")
+        return list(dict.fromkeys(hit["drug"] for hit in self.search(text, field=FIELD_ITEM, section=section, **kwargs)))
+
+    def close(self):
+        self.conn.close()
+
+
+def open_index(path=INDEX_FILE):
+    # 打开索引并与结构数据增量同步
+    index = StructureIndex(path)
+    source = STORE_FILE if os.path.exists(STORE_FILE) else LEGACY_JSON_FILE
+    if os.path.exists(source):
+        index.sync(source)
+    return index
+
+
+if __name__ == "__main__":
+    # 用法: python structure_index.py [--prefix] [--section=临床应用] [--field=drug|section|item] 查询词
+    args = sys.argv[1:]
+    opts = dict(a[2:].split("=", 1) if "=" in a else (a[2:], True) for a in args if a.startswith("--"))
+    words = [a for a in args if not a.startswith("--")]
+
+    start = time.time()
+    index = open_index()
+    print(f"索引同步完成，共 {len(index)} 张卡片，耗时 {(time.time() - start) * 1000:.0f}ms")
+    for word in words:
+        start = time.time()
+        hits = index.search(word, field=opts.get("field"), section=opts.get("section"), prefix="prefix" in opts)
+        print(f"== {word}: {len(hits)} 条，{(time.time() - start) * 1000:.1f}ms")
+        for hit in hits:
+            where = f"【{hit['section']}】" if hit["section"] else ""
+            print(f"  {hit['drug']} {where}{hit['text']}")
+    index.close()
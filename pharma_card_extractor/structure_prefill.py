@@ -0,0 +1,123 @@
+import bisect
+import os
+import re
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+from card_catalog import CardCatalog, load_page_offsets
+from step1_split_pdf import PDF_PATH, POPPLER_PATH, DPI
+from step2_crop_pages import ODD_PAGE_CROP_BOX, EVEN_PAGE_CROP_BOX
+from structure_store import StructureStore
+
+STORE_FILE = "structure_data.db"
+LEGACY_JSON_FILE = "structure_data.json"
+PAGES_MANIFEST = "long_image_pages.json"
+
+# 版式判定：与正文字体颜色不同或字号更大的行视为一级标题；加粗或带编号的行视为二级标题
+HEADING_SIZE_DELTA = 2
+IGNORED_COLORS = {"#ffffff"}  # 标题栏中的白字 (药品名称) 不参与结构
+ITEM_PATTERN = re.compile(r"^\s*(?:[（(]\s*\d+\s*[)）]|\d+[.、．]|[①-⑳])\s*")
+HEADING_STRIP = "【】[]〔〕 ：:"
+
+
+def pdftohtml_path():
+    # 优先使用项目内的 poppler，找不到时使用系统 PATH
+    local = os.path.join(POPPLER_PATH, "pdftohtml")
+    return local if os.path.isdir(POPPLER_PATH) else "pdftohtml"
+
+
+def iter_text_runs(first_page, last_page):
+    # 流式解析 pdftohtml -xml 输出，逐页产出 (页码, 文本块列表)；字体表跨页共享
+    cmd = [pdftohtml_path(), "-xml", "-i", "-q", "-stdout", "-zoom", "1",
+           "-f", str(first_page), "-l", str(last_page), PDF_PATH]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    fonts = {}
+    try:
+        for _, elem in ET.iterparse(proc.stdout, events=("end",)):
+            if elem.tag == "fontspec":
+                fonts[elem.get("id")] = (float(elem.get("size")), elem.get("color", "#000000").lower())
+            elif elem.tag == "page":
+                runs = []
+                for t in elem.iter("text"):
+                    text = "".join(t.itertext()).strip()
+                    if not text: continue
+                    size, color = fonts.get(t.get("font"), (0.0, "#000000"))
+                    runs.append({"top": float(t.get("top")), "left": float(t.get("left")), "text": text,
+                                 "size": size, "color": color, "bold": t.find("b") is not None})
+                yield int(elem.get("number")), runs
+                elem.clear()
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+
+def to_long_image_y(page, top_pt, page_offsets):
+    # PDF 坐标 (pt) -> 300 DPI 渲染 -> 去掉页眉裁剪 -> 长图坐标
+    if page not in page_offsets: return None
+    crop_top = (ODD_PAGE_CROP_BOX if page % 2 != 0 else EVEN_PAGE_CROP_BOX)[1]
+    page_y, page_h = page_offsets[page]
+    y = top_pt * DPI / 72 - crop_top
+    if not 0 <= y < page_h: return None
+    return page_y + y
+
+
+def build_sections(runs):
+    # 按阅读顺序把文本块归并为 [{"title", "items"}]
+    runs = [r for r in runs if r["color"] not in IGNORED_COLORS]
+    if not runs: return []
+    weights = Counter()
+    for r in runs:
+        weights[(r["size"], r["color"])] += len(r["text"])
+    body_size, body_color = weights.most_common(1)[0][0]
+
+    sections = []
+    for r in runs:
+        text = r["text"]
+        if r["color"] != body_color or r["size"] >= body_size + HEADING_SIZE_DELTA:
+            title = text.strip(HEADING_STRIP)
+            if title and not any(s["title"] == title for s in sections):
+                sections.append({"title": title, "items": []})
+        elif sections and (r["bold"] or ITEM_PATTERN.match(text)):
+            item = ITEM_PATTERN.sub("", text).strip()
+            if item: sections[-1]["items"].append(item)
+    return sections
+
+
+def main():
+    catalog = CardCatalog()
+    cards = catalog.cards()
+    catalog.close()
+    if not cards: return
+    pages = load_page_offsets(PAGES_MANIFEST)
+    page_offsets = {page: (y, h) for y, page, h in pages}
+    card_starts = [c["y_start"] for c in cards]
+
+    start = time.time()
+    card_runs = defaultdict(list)
+    for page, runs in iter_text_runs(min(page_offsets), max(page_offsets)):
+        for r in sorted(runs, key=lambda r: (r["top"], r["left"])):
+            y = to_long_image_y(page, r["top"], page_offsets)
+            if y is None: continue
+            i = bisect.bisect_right(card_starts, y) - 1
+            if i >= 0 and y < cards[i]["y_end"]:
+                card_runs[i].append(r)
+
+    # 只为尚未录入的卡片写入草稿，不覆盖人工结果
+    store = StructureStore(STORE_FILE, legacy_json=LEGACY_JSON_FILE)
+    drafts = []
+    for i, card in enumerate(cards):
+        key = CardCatalog.key(card)
+        if store.get(key): continue
+        sections = build_sections(card_runs.get(i, []))
+        if sections: drafts.append((key, sections))
+    store.put_many(drafts)
+    store.close()
+
+    elapsed = time.time() - start
+    rate = len(cards) / elapsed * 60 if elapsed > 0 else 0
+    print(f"已预填 {len(drafts)}/{len(cards)} 张卡片，耗时 {elapsed:.1f}s ({rate:.0f} 张/分钟)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+
+STORE_FILE = "structure_data.db"
+LEGACY_JSON_FILE = "structure_data.json"
+COMPACT_INTERVAL = 200  # 每写入多少次做一次 WAL 检查点
+
+
+def card_sort_key(key):
+    # "drug_10" 按数字后缀排序，无法提取数字的排在后面按字符串排序
+    if '_' in key:
+        suffix = key.split('_')[-1]
+        if suffix.isdigit():
+            return 0, int(suffix)
+    return 1, None
+
+
+class StructureStore:
+    # SQLite 存储：每张卡片一行，保存时只 upsert 改动的卡片，单事务提交
+    def __init__(self, path=STORE_FILE, legacy_json=LEGACY_JSON_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS structures (
+                key TEXT PRIMARY KEY,
+                sort_group INTEGER NOT NULL,
+                sort_y INTEGER,
+                sections TEXT NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_structures_order ON structures (sort_group, sort_y, key)")
+        self.conn.commit()
+        self.writes = 0
+
+        # 首次打开时从旧版 JSON 导入
+        if legacy_json and os.path.exists(legacy_json) and len(self) == 0:
+            self.import_json(legacy_json)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM structures").fetchone()[0]
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM structures WHERE key = ?", (key,)).fetchone() is not None
+
+    def _rows(self, pairs):
+        for key, sections in pairs:
+            group, y = card_sort_key(key)
+            yield key, group, y, json.dumps(sections, ensure_ascii=False)
+
+    def get(self, key, default=None):
+        row = self.conn.execute("SELECT sections FROM structures WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put_many(self, pairs):
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO structures (key, sort_group, sort_y, sections) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET sections = excluded.sections""", self._rows(pairs))
+        self.writes += 1
+        if self.writes % COMPACT_INTERVAL == 0:
+            self.compact()
+
+    def put(self, key, sections):
+        self.put_many([(key, sections)])
+
+    def ensure_keys(self, keys):
+        # 补全尚未录入的卡片为 []，已有数据不受影响
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO structures (key, sort_group, sort_y, sections) VALUES (?, ?, ?, ?)",
+                self._rows((k, []) for k in keys))
+
+    def rename(self, old_key, new_key):
+        group, y = card_sort_key(new_key)
+        with self.conn:
+            self.conn.execute("UPDATE structures SET key = ?, sort_group = ?, sort_y = ? WHERE key = ?",
+                              (new_key, group, y, old_key))
+
+    def delete(self, key):
+        with self.conn:
+            self.conn.execute("DELETE FROM structures WHERE key = ?", (key,))
+
+    def items(self):
+        # 按卡片顺序逐行读取，不整体载入内存
+        cursor = self.conn.execute("SELECT key, sections FROM structures ORDER BY sort_group, sort_y, key")
+        for key, sections in cursor:
+            yield key, json.loads(sections)
+
+    def import_json(self, filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return
+        self.put_many(data.items())
+
+    def export_json(self, filename=LEGACY_JSON_FILE):
+        # 流式写出到临时文件后原子替换，格式与旧版 structure_data.json 一致
+        tmp = f"{filename}.tmp"
+        count = 0
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write("{")
+            for key, sections in self.items():
+                body = json.dumps({key: sections}, ensure_ascii=False, indent=2)[1:-2]
+                f.write(("," if count else "") + body)
+                count += 1
+            f.write("\n}" if count else "}")
+        os.replace(tmp, filename)
+
+    def compact(self):
+        # 将 WAL 合并回主库并截断日志文件
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.compact()
+        self.conn.close()
+
+
+def iter_structure_data(path):
+    # 统一读取接口：支持 SQLite 存储和旧版 JSON 文件
+    if path.endswith(".db"):
+        store = StructureStore(path, legacy_json=None)
+        try:
+            yield from store.items()
+        finally:
+            store.conn.close()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f).items()
@@ -0,0 +1,88 @@
+import math
+from PIL import Image
+from image_cache import LRUImageCache, load_image
+
+TILE_SIZE = 512
+TILE_CACHE_BYTES = 192 * 1024 * 1024
+LEVEL_CACHE_BYTES = 160 * 1024 * 1024  # 已生成的金字塔层，约可容纳两三张长卡片的原图及其缩小层
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+class TilePyramid:
+    # 卡片图像金字塔：第 n 层为原图缩小 2^n 倍；尺寸取自文件头或卡片目录，
+    # 只有可见瓦片未命中缓存时才解码原图，生成的层按路径缓存，重新打开同一张卡片时直接复用
+    def __init__(self, path, cache, level_cache, size=None, loader=None, tile_size=TILE_SIZE):
+        # loader 返回完整原图 (如按需渲染的引用卡片)，未给出时从 path 读取
+        self.path = path
+        self.cache = cache
+        self.level_cache = level_cache
+        self.loader = loader or (lambda: load_image(path))
+        self.tile_size = tile_size
+        if size is None:
+            with Image.open(path) as img:
+                size = img.size
+        self.width, self.height = size
+
+    def display_size(self, scale):
+        return max(1, math.ceil(self.width * scale)), max(1, math.ceil(self.height * scale))
+
+    def grid_size(self, scale):
+        w, h = self.display_size(scale)
+        return math.ceil(w / self.tile_size), math.ceil(h / self.tile_size)
+
+    def max_level(self):
+        # 与逐层 reduce(2) 相同：短边不足 2 像素时停止
+        level, w, h = 0, self.width, self.height
+        while min(w, h) >= 2:
+            level, w, h = level + 1, math.ceil(w / 2), math.ceil(h / 2)
+        return level
+
+    def level_image(self, level):
+        key = (str(self.path), level)
+        img = self.level_cache.get(key)
+        if img is None:
+            if level == 0:
+                img = self.loader()
+                if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+            else:
+                img = self.level_image(level - 1).reduce(2)
+            self.level_cache.put(key, img)
+        return img
+
+    def get_level(self, scale):
+        # 选取不小于目标分辨率的最粗一层，缩小时只需对小图重采样
+        level = max(0, int(math.floor(math.log2(1 / scale)))) if scale < 1 else 0
+        level = min(level, self.max_level())
+        return self.level_image(level), 2 ** level
+
+    def tile(self, scale, col, row):
+        key = (str(self.path), round(scale, 4), col, row)
+        img = self.cache.get(key)
+        if img is not None:
+            return img
+
+        w, h = self.display_size(scale)
+        x0, y0 = col * self.tile_size, row * self.tile_size
+        x1, y1 = min(w, x0 + self.tile_size), min(h, y0 + self.tile_size)
+        src, factor = self.get_level(scale)
+        ls = scale * factor
+        box = (x0 / ls, y0 / ls, min(src.width, x1 / ls), min(src.height, y1 / ls))
+        img = src.resize((x1 - x0, y1 - y0), Image.Resampling.LANCZOS, box=box)
+        self.cache.put(key, img)
+        return img
+
+    def visible_tiles(self, scale, left, top, right, bottom):
+        # 返回与视口相交的瓦片坐标 (col, row)
+        cols, rows = self.grid_size(scale)
+        c0, c1 = max(0, int(left // self.tile_size)), min(cols - 1, int(right // self.tile_size))
+        r0, r1 = max(0, int(top // self.tile_size)), min(rows - 1, int(bottom // self.tile_size))
+        return [(c, r) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+
+def new_tile_cache():
+    return LRUImageCache(TILE_CACHE_BYTES)
+
+
+def new_level_cache():
+    return LRUImageCache(LEVEL_CACHE_BYTES)
@@ -0,0 +1,72 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+
+INPUT_DIR = "check_titles_dir"
+ATLAS_DIR = "title_atlas"
+INDEX_FILENAME = "index.json"
+CELL_WIDTH, CELL_HEIGHT = 440, 56
+GRID_COLS, GRID_ROWS = 4, 16
+CELL_PADDING = 2
+BACKGROUND = (51, 51, 51)
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+def title_sort_key(f):
+    return (0, int(f.stem)) if f.stem.isdigit() else (1, f.stem)
+
+
+def cell_origin(slot):
+    # 单元格在图集中的左上角坐标
+    return (slot % GRID_COLS) * CELL_WIDTH, (slot // GRID_COLS) * CELL_HEIGHT
+
+
+def build_sheet(sheet_idx, paths, out_dir):
+    # 将一页标题缩小后拼成一张图集，返回图集文件名和单元格对应的原文件名
+    sheet = Image.new("RGB", (CELL_WIDTH * GRID_COLS, CELL_HEIGHT * GRID_ROWS), BACKGROUND)
+    box_w, box_h = CELL_WIDTH - 2 * CELL_PADDING, CELL_HEIGHT - 2 * CELL_PADDING
+    names = []
+    for slot, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                img = img.convert("RGB")
+                img.thumbnail((box_w, box_h), Image.Resampling.LANCZOS)
+                x, y = cell_origin(slot)
+                sheet.paste(img, (x + (CELL_WIDTH - img.width) // 2, y + (CELL_HEIGHT - img.height) // 2))
+            names.append(Path(path).name)
+        except Exception as e:
+            print(f"处理失败 {Path(path).name}: {e}")
+            names.append(None)
+
+    filename = f"atlas_{sheet_idx:04d}.png"
+    sheet.save(Path(out_dir) / filename)
+    return filename, names
+
+
+def main():
+    input_path, out_path = Path(INPUT_DIR), Path(ATLAS_DIR)
+    if not input_path.exists(): return
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    files = sorted(input_path.glob("*.png"), key=title_sort_key)
+    per_sheet = GRID_COLS * GRID_ROWS
+    chunks = [[str(f) for f in files[i:i + per_sheet]] for i in range(0, len(files), per_sheet)]
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = list(pool.map(build_sheet, range(len(chunks)), chunks, [str(out_path)] * len(chunks)))
+
+    index = {
+        "cell_width": CELL_WIDTH, "cell_height": CELL_HEIGHT,
+        "cols": GRID_COLS, "rows": GRID_ROWS,
+        "sheets": [{"file": filename, "cells": names} for filename, names in results],
+    }
+    with open(out_path / INDEX_FILENAME, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    print(f"已生成 {len(results)} 张图集，共 {len(files)} 个标题")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
-import time
+import os
+import sys
+import json
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from pathlib import Path
+from image_cache import ImagePrefetcher, load_image
 
 IMAGE_DIR = "check_titles_dir"
-FRAME_INTERVAL = 0.2
+PREFETCH_RADIUS = 8
+ATLAS_DIR = "title_atlas"
+ATLAS_INDEX = "index.json"
+REJECTED_DIR = "false_positive_titles"
 
 class DrugTitleViewer:
     def __init__(self, root):
         self.root = root
         self.image_files = self.load_file_list()
         self.current_index = 0
-        self.last_action_time = 0
+        self.loader = ImagePrefetcher(load_image, radius=PREFETCH_RADIUS)
 
         self.info_label = tk.Label(root, font=("Arial", 12, "bold"))
         self.info_label.pack(side="top", fill="x")
@@ -32,21 +38,109 @@ class DrugTitleViewer:
     def show_current(self):
         fpath = self.image_files[self.current_index]
         self.info_label.config(text=f"{self.current_index + 1}/{len(self.image_files)} - {fpath.name}")
-        tk_img = ImageTk.PhotoImage(Image.open(fpath))
+        tk_img = ImageTk.PhotoImage(self.loader.get(fpath))
         self.img_label.config(image=tk_img)
         self.img_label.image = tk_img
+        self.loader.prefetch_around(self.image_files, self.current_index)
 
     def navigate(self, delta):
-        now = time.time()
-        if now - self.last_action_time > FRAME_INTERVAL:
-            self.current_index = max(0, min(len(self.image_files)-1, self.current_index + delta))
+        # 图片已在后台预解码，无需再对按键限流
+        index = max(0, min(len(self.image_files)-1, self.current_index + delta))
+        if index != self.current_index:
+            self.current_index = index
             self.show_current()
-            self.last_action_time = now
 
     def next_image(self, event=None): self.navigate(1)
     def prev_image(self, event=None): self.navigate(-1)
 
+class TitleGridViewer:
+    # 网格模式：整页显示 title_atlas.py 预生成的图集，点击或空格把误检移入 REJECTED_DIR，再次操作可撤销
+    def __init__(self, root):
+        self.root = root
+        with open(Path(ATLAS_DIR) / ATLAS_INDEX, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.sheets = index["sheets"]
+        self.cell_w, self.cell_h = index["cell_width"], index["cell_height"]
+        self.cols, self.rows = index["cols"], index["rows"]
+        self.sheet_files = [s["file"] for s in self.sheets]
+        rejected_path = Path(REJECTED_DIR)
+        self.rejected = {f.name for f in rejected_path.glob("*.png")} if rejected_path.exists() else set()
+        self.sheet_idx = 0
+        self.cursor = 0
+        self.loader = ImagePrefetcher(lambda f: load_image(Path(ATLAS_DIR) / f), radius=2)
+
+        self.info_label = tk.Label(root, font=("Arial", 12, "bold"))
+        self.info_label.pack(side="top", fill="x")
+        self.canvas = tk.Canvas(root, bg="#333333", highlightthickness=0,
+                                width=self.cell_w * self.cols, height=self.cell_h * self.rows)
+        self.canvas.pack(expand=True, fill="both")
+        tk.Label(root, text="点击/空格: 标记误检 | 方向键: 移动光标 | PageUp/PageDown: 翻页", fg="blue").pack()
+
+        self.canvas.bind("<Button-1>", self.on_click)
+        root.bind("<Prior>", lambda e: self.show_sheet(self.sheet_idx - 1))
+        root.bind("<Next>", lambda e: self.show_sheet(self.sheet_idx + 1))
+        root.bind("<Left>", lambda e: self.move_cursor(-1))
+        root.bind("<Right>", lambda e: self.move_cursor(1))
+        root.bind("<Up>", lambda e: self.move_cursor(-self.cols))
+        root.bind("<Down>", lambda e: self.move_cursor(self.cols))
+        root.bind("<space>", lambda e: self.toggle(self.cursor))
+        self.show_sheet(0)
+
+    def cells(self):
+        return self.sheets[self.sheet_idx]["cells"]
+
+    def show_sheet(self, idx):
+        if not self.sheets or not 0 <= idx < len(self.sheets): return
+        self.sheet_idx = idx
+        self.cursor = min(self.cursor, len(self.cells()) - 1)
+        self.tk_img = ImageTk.PhotoImage(self.loader.get(self.sheet_files[idx]))
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, anchor="nw", image=self.tk_img)
+        self.draw_marks()
+        self.loader.prefetch_around(self.sheet_files, idx)
+
+    def draw_marks(self):
+        self.canvas.delete("mark")
+        for slot, name in enumerate(self.cells()):
+            if name in self.rejected:
+                x, y = (slot % self.cols) * self.cell_w, (slot // self.cols) * self.cell_h
+                self.canvas.create_rectangle(x + 1, y + 1, x + self.cell_w - 1, y + self.cell_h - 1,
+                                             outline="red", width=3, tags="mark")
+                self.canvas.create_line(x, y, x + self.cell_w, y + self.cell_h, fill="red", width=2, tags="mark")
+        x, y = (self.cursor % self.cols) * self.cell_w, (self.cursor // self.cols) * self.cell_h
+        self.canvas.create_rectangle(x, y, x + self.cell_w, y + self.cell_h, outline="yellow", width=2, tags="mark")
+
+        name = self.cells()[self.cursor] if self.cells() else None
+        self.info_label.config(text=f"图集 {self.sheet_idx + 1}/{len(self.sheets)} - {name} - 已标记误检 {len(self.rejected)}")
+
+    def move_cursor(self, delta):
+        slot = self.cursor + delta
+        if 0 <= slot < len(self.cells()):
+            self.cursor = slot
+            self.draw_marks()
+
+    def on_click(self, event):
+        slot = (event.y // self.cell_h) * self.cols + event.x // self.cell_w
+        if event.x < self.cell_w * self.cols and 0 <= slot < len(self.cells()):
+            self.cursor = slot
+            self.toggle(slot)
+
+    def toggle(self, slot):
+        name = self.cells()[slot]
+        if not name: return
+        src, dst = Path(IMAGE_DIR) / name, Path(REJECTED_DIR) / name
+        if name in self.rejected:
+            os.replace(dst, src)
+            self.rejected.discard(name)
+        else:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dst)
+            self.rejected.add(name)
+        self.draw_marks()
+
 if __name__ == "__main__":
     root = tk.Tk()
-    app = DrugTitleViewer(root)
-    root.mainloop()
\ No newline at end of file
+    # 加 --grid 参数进入网格模式 (需先运行 title_atlas.py)
+    app = TitleGridViewer(root) if "--grid" in sys.argv[1:] else DrugTitleViewer(root)
+    root.mainloop()
+    app.loader.shutdown()
\ No newline at end of file